@@ -1,8 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils import timezone
 from django.utils.html import format_html
 import jdatetime
-from .models import CustomUser, ContactMessage, UserMessage
+from .models import CustomUser, ContactMessage, Conversation, UserMessage, Broadcast, Job
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 
@@ -37,7 +38,13 @@ class CustomUserAdmin(UserAdmin):
     
     def profile_image_preview(self, obj):
         if obj.profile_image:
-            return format_html('<img src="{}" width="50" height="50" style="border-radius: 50%;" />', obj.profile_image.url)
+            return format_html(
+                '<picture><source type="image/webp" srcset="{}" sizes="50px">'
+                '<img src="{}" srcset="{}" sizes="50px" width="50" height="50" style="border-radius: 50%;" /></picture>',
+                obj.get_profile_image_srcset('webp'),
+                obj.get_profile_image_url(96),
+                obj.get_profile_image_srcset('jpeg')
+            )
         return format_html('<div style="width: 50px; height: 50px; border-radius: 50%; background: #667eea; color: white; display: flex; align-items: center; justify-content: center;">{}{}</div>', 
                           obj.first_name[0] if obj.first_name else '', 
                           obj.last_name[0] if obj.last_name else '')
@@ -107,6 +114,57 @@ class UserMessageAdmin(admin.ModelAdmin):
     get_created_at_jalali.short_description = 'تاریخ ارسال'
     get_created_at_jalali.admin_order_field = 'created_at'
 
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'message_count', 'get_last_message_at_jalali')
+    list_filter = ('kind',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('user', 'contact_message', 'participants')
+    readonly_fields = ('message_count', 'last_message_at', 'created_at')
+    
+    def get_last_message_at_jalali(self, obj):
+        if obj.last_message_at:
+            jalali_date = jdatetime.datetime.fromgregorian(datetime=obj.last_message_at)
+            return jalali_date.strftime('%Y/%m/%d - %H:%M')
+        return '-'
+    
+    get_last_message_at_jalali.short_description = 'آخرین پیام'
+    get_last_message_at_jalali.admin_order_field = 'last_message_at'
+
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'user_type', 'age_group', 'status', 'sent_count', 'total_recipients', 'get_created_at_jalali')
+    list_filter = ('status', 'user_type', 'age_group')
+    search_fields = ('subject', 'content')
+    readonly_fields = ('created_by', 'status', 'total_recipients', 'sent_count', 'created_at', 'finished_at')
+    
+    def get_created_at_jalali(self, obj):
+        return obj.get_created_at_jalali() or '-'
+    
+    get_created_at_jalali.short_description = 'تاریخ ایجاد'
+    get_created_at_jalali.admin_order_field = 'created_at'
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'get_created_at_jalali', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('name', 'payload', 'status', 'attempts', 'last_error', 'run_at', 'created_at', 'started_at', 'finished_at')
+    actions = ['retry_jobs']
+    
+    def get_created_at_jalali(self, obj):
+        return obj.get_created_at_jalali() or '-'
+    
+    get_created_at_jalali.short_description = 'تاریخ ایجاد'
+    get_created_at_jalali.admin_order_field = 'created_at'
+    
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='pending', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f'{updated} کار دوباره در صف قرار گرفت.')
+    
+    retry_jobs.short_description = 'اجرای دوباره کارهای انتخاب شده'
+
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(ContactMessage, ContactMessageAdmin)
-admin.site.register(UserMessage, UserMessageAdmin)
\ No newline at end of file
+admin.site.register(UserMessage, UserMessageAdmin)
+admin.site.register(Conversation, ConversationAdmin)
+admin.site.register(Broadcast, BroadcastAdmin)
+admin.site.register(Job, JobAdmin)
\ No newline at end of file
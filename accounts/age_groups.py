@@ -0,0 +1,79 @@
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+# (حداقل سن، گروه سنی) از بزرگترین بازه به کوچکترین
+AGE_GROUP_BRACKETS = (
+    (25, 'over_25'),
+    (15, '15_25'),
+    (7, '7_15'),
+    (0, 'under_7'),
+)
+
+
+def local_today():
+    """
+    تاریخ امروز در منطقه زمانی سایت؛ همه محاسبات سن (ذخیره کاربر، ورود گروهی،
+    recompute_age_groups و اعتبارسنجی فرم‌ها) باید از همین تابع استفاده کنند تا
+    نزدیک نیمه‌شب بین UTC و وقت محلی اختلاف یک روزه پیش نیاید.
+    """
+    return timezone.localdate()
+
+
+def years_ago(today, years):
+    """تاریخی که هر کس تا آن روز (یا قبل از آن) به دنیا آمده باشد حداقل years سال دارد"""
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        # ۲۹ اسفند/فوریه در سال غیر کبیسه
+        return today.replace(year=today.year - years, day=28)
+
+
+def age_group_for(birth_date, today=None):
+    if not birth_date:
+        return None
+    today = today or local_today()
+    for min_age, age_group in AGE_GROUP_BRACKETS:
+        if birth_date <= years_ago(today, min_age):
+            return age_group
+    # تاریخ تولد در آینده
+    return 'under_7'
+
+
+def stale_age_groups(queryset, today=None):
+    """
+    برای هر بازه سنی، (گروه سنی، queryset کاربرانی که در این بازه هستند ولی
+    گروه سنی دیگری دارند) بر اساس مرزهای birth_date.
+    """
+    today = today or local_today()
+    queryset = queryset.filter(birth_date__isnull=False)
+    upper = None
+    for min_age, age_group in AGE_GROUP_BRACKETS:
+        lower_bound = years_ago(today, min_age) if min_age else datetime.date.max
+        bracket = queryset.filter(birth_date__lte=lower_bound)
+        if upper is not None:
+            bracket = bracket.filter(birth_date__gt=upper)
+        yield age_group, bracket.exclude(age_group=age_group)
+        upper = lower_bound
+
+
+def crossed_age_boundary(since, today=None):
+    """شرط کاربرانی که بعد از تاریخ since (تا امروز) وارد بازه سنی جدیدی شده‌اند"""
+    today = today or local_today()
+    condition = Q()
+    for min_age, _ in AGE_GROUP_BRACKETS:
+        if min_age:
+            condition |= Q(birth_date__gt=years_ago(since, min_age), birth_date__lte=years_ago(today, min_age))
+    return condition
+
+
+def assign_age_groups(queryset, today=None):
+    """
+    محاسبه گروه سنی ردیف‌های queryset با یک UPDATE برای هر بازه سنی
+    روی مرزهای birth_date، به جای ذخیره تک تک کاربران.
+    """
+    return sum(
+        stale.update(age_group=age_group)
+        for age_group, stale in stale_age_groups(queryset, today)
+    )
@@ -5,4 +5,5 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
     verbose_name = 'مدیریت کاربران'
     def ready(self):
-        import accounts.signals
\ No newline at end of file
+        import accounts.signals
+        import accounts.tasks
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+backend احراز هویت با cache کاربر.
+
+AuthenticationMiddleware در هر درخواست کاربر جلسه را با get_user() از پایگاه
+داده می‌خواند. این backend کاربر را در cache نگه می‌دارد تا (همراه با
+SESSION_ENGINE = cached_db) درخواست‌های تکراری هیچ کوئری برای احراز هویت
+نداشته باشند. Django همچنان session auth hash جلسه را با رمز عبور کاربر
+cache شده مقایسه می‌کند و با ذخیره یا حذف کاربر (سیگنال‌ها) یا تغییر گروهی
+(users_bulk_updated) مقدار cache شده پاک می‌شود.
+
+فیلدهایی که با update() تغییر می‌کنند (مثل unread_messages_count) در کاربر
+cache شده به‌روز نیستند و نباید از request.user خوانده شوند.
+
+aauthenticate (ورود async) رمز عبور را به جای event loop در thread pool
+hash ها بررسی می‌کند.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+from .hashers import acheck_password, amake_password
+
+UserModel = get_user_model()
+
+AUTH_USER_CACHE_KEY = 'accounts:auth_user:{}'
+AUTH_USER_CACHE_TTL = 300
+
+
+def auth_user_cache_key(user_id):
+    return AUTH_USER_CACHE_KEY.format(user_id)
+
+
+def invalidate_cached_users(user_ids):
+    keys = [auth_user_cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    # بعد از commit هم پاک می‌شود تا درخواست همزمان مقدار قدیمی را دوباره cache نکند
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = auth_user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, AUTH_USER_CACHE_TTL)
+        return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # مثل ModelBackend یک بار hash انجام می‌شود تا زمان پاسخ، وجود کاربر را لو ندهد
+            await amake_password(password)
+            return None
+        if await acheck_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
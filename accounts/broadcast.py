@@ -0,0 +1,68 @@
+"""
+ارسال پیام همگانی به صورت کار پس‌زمینه (accounts.jobs).
+
+ارسال بخش به بخش (keyset روی pk) انجام می‌شود و شناسه آخرین گیرنده هر بخش در
+همان تراکنشِ ساخت پیام‌ها ذخیره می‌شود؛ اگر worker وسط ارسال از کار بیفتد یا
+خطا رخ دهد، اجرای دوباره کار از همان نقطه ادامه می‌دهد و پیامی تکراری نمی‌شود.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import Broadcast, UserMessage
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHUNK_SIZE = 500
+
+
+def start_broadcast(broadcast):
+    """ثبت کار ارسال پیام همگانی؛ بعد از commit تراکنش جاری توسط run_jobs اجرا می‌شود"""
+    enqueue('broadcast', broadcast_id=broadcast.pk)
+
+
+def run_broadcast(broadcast_id):
+    broadcast = Broadcast.objects.filter(pk=broadcast_id).first()
+    if broadcast is None or broadcast.status == 'done':
+        return
+    recipients = broadcast.get_recipients()
+    Broadcast.objects.filter(pk=broadcast_id).update(
+        status='running',
+        total_recipients=broadcast.sent_count + recipients.filter(pk__gt=broadcast.last_recipient_id).count()
+    )
+
+    last_id = broadcast.last_recipient_id
+    try:
+        while True:
+            # keyset روی pk تا هر بخش هزینه ثابتی داشته باشد
+            user_ids = list(
+                recipients.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:BROADCAST_CHUNK_SIZE]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                UserMessage.objects.bulk_send(
+                    user_ids,
+                    is_from_admin=True,
+                    message_type=broadcast.message_type,
+                    subject=broadcast.subject,
+                    content=broadcast.content,
+                    sender_id=broadcast.created_by_id,
+                    is_read=False
+                )
+                Broadcast.objects.filter(pk=broadcast_id).update(
+                    sent_count=F('sent_count') + len(user_ids),
+                    last_recipient_id=user_ids[-1]
+                )
+            last_id = user_ids[-1]
+    except Exception as e:
+        # کار با تأخیر دوباره اجرا می‌شود و از last_recipient_id ادامه می‌دهد
+        logger.error(f"خطا در ارسال پیام همگانی {broadcast_id}: {str(e)}")
+        Broadcast.objects.filter(pk=broadcast_id).update(status='failed', finished_at=timezone.now())
+        raise
+
+    Broadcast.objects.filter(pk=broadcast_id).update(status='done', finished_at=timezone.now())
+    logger.info(f"پیام همگانی {broadcast_id} ارسال شد")
@@ -1,53 +1,62 @@
-from django.db.models import Q
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 from .models import UserMessage
+from .counters import get_unread_count
 import jdatetime
 
 def unread_messages_count(request):
     """شمارش پیام‌های خوانده نشده برای نمایش در navbar"""
+    # SSE فقط زیر ASGI؛ در غیر این صورت تمپلیت با فاصله زمانی ثابت poll می‌کند
+    context = {
+        'notification_stream_enabled': getattr(settings, 'ACCOUNTS_NOTIFICATION_STREAM', False),
+        'notification_poll_interval': getattr(settings, 'ACCOUNTS_NOTIFICATION_POLL_INTERVAL', 30),
+    }
     if request.user.is_authenticated and not request.user.is_anonymous:
         try:
-            unread_count = UserMessage.objects.filter(
-                Q(user=request.user) | Q(receiver=request.user),
-                is_read=False,
-                is_from_admin=True
-            ).distinct().count()
-            return {'user_messages_unread': unread_count}
+            context['user_messages_unread'] = get_unread_count(request.user.pk)
         except:
-            return {'user_messages_unread': 0}
-    return {'user_messages_unread': 0}
+            context['user_messages_unread'] = 0
+        return context
+    context['user_messages_unread'] = 0
+    return context
 
 
 def user_info(request):
-    """اطلاعات کاربر برای نمایش در navbar"""
-    if request.user.is_authenticated and not request.user.is_anonymous:
-        try:
-            # تعداد کل پیام‌های کاربر
-            total_messages = UserMessage.objects.filter(
-                Q(user=request.user) | Q(receiver=request.user)
-            ).distinct().count()
-            
-            # پیام‌های اخیر
-            recent_messages = UserMessage.objects.filter(
-                Q(user=request.user) | Q(receiver=request.user)
-            ).distinct().order_by('-created_at')[:5]
-            
-            return {
-                'user_total_messages': total_messages,
-                'user_recent_messages': recent_messages,
-                'user_profile_image_url': request.user.get_profile_image_url() if hasattr(request.user, 'get_profile_image_url') else '',
-            }
-        except:
-            return {
-                'user_total_messages': 0,
-                'user_recent_messages': [],
-                'user_profile_image_url': '',
-            }
+    """
+    اطلاعات کاربر برای نمایش در navbar.
+
+    مقادیر lazy هستند: کوئری فقط وقتی اجرا می‌شود که تمپلیت واقعاً آن را
+    بخواند، و نتیجه روی request نگه داشته می‌شود تا در هر درخواست حداکثر
+    یک بار محاسبه شود.
+    """
+    if not (request.user.is_authenticated and not request.user.is_anonymous):
+        return {
+            'user_total_messages': 0,
+            'user_recent_messages': [],
+            'user_profile_image_url': '',
+        }
     
-    return {
-        'user_total_messages': 0,
-        'user_recent_messages': [],
-        'user_profile_image_url': '',
-    }
+    if not hasattr(request, '_user_info_context'):
+        user = request.user
+        
+        def total_messages():
+            try:
+                return UserMessage.objects.filter(user=user).count()
+            except:
+                return 0
+        
+        def recent_messages():
+            try:
+                return list(UserMessage.objects.filter(user=user).order_by('-created_at', '-id')[:5])
+            except:
+                return []
+        
+        request._user_info_context = {
+            'user_total_messages': SimpleLazyObject(total_messages),
+            'user_recent_messages': SimpleLazyObject(recent_messages),
+            'user_profile_image_url': SimpleLazyObject(user.get_profile_image_url),
+        }
+    return request._user_info_context
 
 def jalali_filters(request):
     """اضافه کردن فیلترهای تاریخ شمسی به context"""
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .backends import invalidate_cached_users
+from .models import CustomUser
+from .notifications import publish_unread_counts
+
+UNREAD_COUNT_CACHE_KEY = 'accounts:unread_count:{}'
+# پاک شدن cache فقط در همان پروسه‌ای اثر دارد که شمارنده را تغییر داده است؛
+# با cache محلی هر پروسه (LocMemCache) پروسه‌های دیگر حداکثر این مدت مقدار
+# قدیمی را نشان می‌دهند. با cache مشترک این TTL فقط یک حد اطمینان است
+UNREAD_COUNT_CACHE_TTL = 60
+
+
+def unread_count_cache_key(user_id):
+    return UNREAD_COUNT_CACHE_KEY.format(user_id)
+
+
+def get_unread_count(user_id):
+    """شمارنده پیام‌های خوانده نشده کاربر؛ در حالت عادی فقط از cache خوانده می‌شود"""
+    key = unread_count_cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = CustomUser.objects.filter(pk=user_id).values_list(
+            'unread_messages_count', flat=True
+        ).first() or 0
+        cache.set(key, count, UNREAD_COUNT_CACHE_TTL)
+    return count
+
+
+def invalidate_unread_counts(user_ids):
+    cache.delete_many([unread_count_cache_key(user_id) for user_id in user_ids])
+
+
+def refresh_unread_counts(user_ids):
+    """خواندن شمارنده چند کاربر با یک کوئری و قرار دادن آن‌ها در cache"""
+    counts = dict(
+        CustomUser.objects.filter(pk__in=user_ids).values_list('pk', 'unread_messages_count')
+    )
+    cache.set_many({unread_count_cache_key(user_id): count for user_id, count in counts.items()}, UNREAD_COUNT_CACHE_TTL)
+    return counts
+
+
+def adjust_unread_count(user_ids, delta):
+    """تغییر شمارنده‌ی چند کاربر با یک UPDATE و پاک کردن مقدار cache شده"""
+    user_ids = list(user_ids)
+    if not user_ids or not delta:
+        return
+    users = CustomUser.objects.filter(pk__in=user_ids)
+    if delta < 0:
+        # شمارنده هرگز منفی نمی‌شود؛ اختلاف احتمالی با reconcile_unread_counts اصلاح می‌شود
+        users = users.filter(unread_messages_count__gte=-delta)
+    users.update(unread_messages_count=F('unread_messages_count') + delta)
+    invalidate_unread_counts(user_ids)
+    # کاربر cache شده احراز هویت هم شمارنده قدیمی را دارد
+    invalidate_cached_users(user_ids)
+    # بعد از commit مقدار جدید در cache گرم می‌شود و به تب‌های باز کاربران اعلام می‌شود
+    transaction.on_commit(lambda: publish_unread_counts(refresh_unread_counts(user_ids)))
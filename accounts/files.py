@@ -0,0 +1,151 @@
+"""
+ارسال فایل‌های آپلود شده (مستند شغلی و ...) به صورت تکه تکه و با پشتیبانی از
+درخواست‌های Range، تا پیش‌نمایش PDF و تصاویر بزرگ بخش به بخش بارگذاری شود.
+
+با تنظیم ACCOUNTS_FILE_OFFLOAD می‌توان ارسال فایل را به وب سرور جلویی سپرد:
+- 'x-accel-redirect' (nginx): مسیر ACCOUNTS_X_ACCEL_PREFIX + نام فایل برگردانده می‌شود؛
+  این مسیر باید در nginx یک location از نوع internal به MEDIA_ROOT باشد.
+- 'x-sendfile' (Apache mod_xsendfile و ...): مسیر کامل فایل برگردانده می‌شود.
+در این حالت worker پایتون هیچ بایتی از فایل را ارسال نمی‌کند و Range هم توسط
+وب سرور پاسخ داده می‌شود.
+
+پاسخ‌ها ETag و Last-Modified (از روی mtime و اندازه فایل) دارند و درخواست‌های
+شرطی (If-None-Match / If-Modified-Since) بدون خواندن فایل پاسخ 304 می‌گیرند.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# پسوندهایی که ممکن است در mime.types سیستم نباشند
+mimetypes.add_type('application/msword', '.doc')
+mimetypes.add_type('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx')
+
+
+def guess_content_type(name):
+    content_type, encoding = mimetypes.guess_type(name)
+    if encoding or not content_type:
+        return 'application/octet-stream'
+    return content_type
+
+
+def file_validators(path):
+    """(ETag، زمان آخرین تغییر، اندازه) فایل فقط با یک stat"""
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    return etag, int(stat.st_mtime), stat.st_size
+
+
+def if_range_matches(request, etag, last_modified):
+    """Range فقط وقتی اعمال می‌شود که If-Range (در صورت وجود) با نسخه فعلی فایل یکی باشد"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def parse_range(header, size):
+    """
+    بازه (start, end) یک هدر Range تک بازه‌ای، یا None اگر هدر نادیده گرفته
+    شود (چند بازه یا فرمت نامعتبر)؛ برای بازه خارج از فایل ValueError.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # bytes=-500 یعنی ۵۰۰ بایت آخر
+        length = int(end)
+        if not length or not size:
+            # روی فایل خالی هیچ بازه‌ای قابل ارضا نیست
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def offload_response(field_file, content_type):
+    offload = getattr(settings, 'ACCOUNTS_FILE_OFFLOAD', None)
+    if not offload:
+        return None
+    response = HttpResponse(content_type=content_type)
+    if offload == 'x-accel-redirect':
+        prefix = getattr(settings, 'ACCOUNTS_X_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name.replace(os.sep, '/'))
+    elif offload == 'x-sendfile':
+        # مسیرهای غیر ASCII (نام فایل فارسی) به صورت percent-encoded ارسال می‌شوند
+        response['X-Sendfile'] = quote(field_file.path)
+    else:
+        raise ValueError(f'ACCOUNTS_FILE_OFFLOAD نامعتبر است: {offload}')
+    return response
+
+
+def send_file(request, path, content_type, etag, last_modified, size):
+    byte_range = None
+    if if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range', ''), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(read_range(path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def file_response(request, field_file, as_attachment=False, filename=None):
+    """
+    پاسخ ارسال یک FieldFile ذخیره شده روی دیسک، با نوع محتوای درست و
+    validatorهای cache؛ مرورگر قبل از استفاده از نسخه cache شده اعتبار آن را می‌پرسد.
+    filename نامی است که به کاربر نشان داده می‌شود (پیش‌فرض: نام فایل ذخیره شده).
+    """
+    filename = filename or os.path.basename(field_file.name)
+    content_type = guess_content_type(filename)
+    path = field_file.path
+    etag, last_modified, size = file_validators(path)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = offload_response(field_file, content_type)
+        if response is None:
+            response = send_file(request, path, content_type, etag, last_modified, size)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -1,9 +1,12 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth import authenticate
+from django.contrib.auth import aauthenticate, authenticate
+from asgiref.sync import sync_to_async
 from django.core.validators import FileExtensionValidator
 from captcha.fields import CaptchaField
-from .models import CustomUser, ContactMessage, UserMessage
+from .age_groups import local_today
+from .models import CustomUser, ContactMessage, UserMessage, Broadcast
+from .jobs import enqueue
 import jdatetime
 
 class JalaliDateInput(forms.DateInput):
@@ -31,6 +34,8 @@ def jalali_to_gregorian(jalali_date_str):
 
 class CustomUserCreationForm(UserCreationForm):
     captcha = CaptchaField(label='کد امنیتی')
+    # hash آماده رمز عبور؛ اگر تنظیم شود save دوباره hash نمی‌کند
+    password_hash = None
     birth_date_jalali = forms.CharField(
         label='تاریخ تولد (هجری شمسی)',
         required=False,
@@ -89,12 +94,20 @@ class CustomUserCreationForm(UserCreationForm):
             gregorian_date = jalali_to_gregorian(birth_date_jalali)
             if not gregorian_date:
                 raise forms.ValidationError('تاریخ تولد معتبر نیست. فرمت صحیح: ۱۳۹۹/۰۱/۰۱')
-            import datetime
-            if gregorian_date > datetime.date.today():
+            if gregorian_date > local_today():
                 raise forms.ValidationError('تاریخ تولد نمی‌تواند در آینده باشد')
             return gregorian_date
         return None
     
+    def set_password_and_save(self, user, password_field_name='password1', commit=True):
+        if self.password_hash:
+            # رمز عبور از قبل در thread pool hash شده است (register_view)
+            user.password = self.password_hash
+            if commit:
+                user.save()
+            return user
+        return super().set_password_and_save(user, password_field_name, commit)
+    
     def save(self, commit=True):
         user = super().save(commit=False)
         birth_date_gregorian = self.cleaned_data.get('birth_date_jalali')
@@ -102,6 +115,9 @@ class CustomUserCreationForm(UserCreationForm):
             user.birth_date = birth_date_gregorian
         if commit:
             user.save()
+            if 'profile_image' in self.changed_data:
+                # ساخت تصاویر کوچک خارج از درخواست (دستور run_jobs)
+                enqueue('profile_thumbnails', user_id=user.pk)
         return user
 
 class ProfileUpdateForm(forms.ModelForm):
@@ -155,19 +171,28 @@ class ProfileUpdateForm(forms.ModelForm):
             gregorian_date = jalali_to_gregorian(birth_date_jalali)
             if not gregorian_date:
                 raise forms.ValidationError('تاریخ تولد معتبر نیست. فرمت صحیح: ۱۳۹۹/۰۱/۰۱')
-            import datetime
-            if gregorian_date > datetime.date.today():
+            if gregorian_date > local_today():
                 raise forms.ValidationError('تاریخ تولد نمی‌تواند در آینده باشد')
             return gregorian_date
         return None
     
+    def get_update_fields(self):
+        model_fields = {field.name for field in CustomUser._meta.concrete_fields}
+        fields = [name for name in self._meta.fields if name in model_fields]
+        return fields + ['birth_date', 'updated_at']
+    
     def save(self, commit=True):
         user = super().save(commit=False)
         birth_date_gregorian = self.cleaned_data.get('birth_date_jalali')
         if birth_date_gregorian:
             user.birth_date = birth_date_gregorian
         if commit:
-            user.save()
+            # فقط فیلدهای فرم ذخیره می‌شوند تا ستون‌های denormalized (مثل
+            # unread_messages_count) از نمونه cache شده request.user بازنویسی نشوند
+            user.save(update_fields=self.get_update_fields())
+            if 'profile_image' in self.changed_data:
+                # ساخت تصاویر کوچک خارج از درخواست (دستور run_jobs)
+                enqueue('profile_thumbnails', user_id=user.pk)
         return user
 
 class LoginForm(forms.Form):
@@ -181,15 +206,45 @@ class LoginForm(forms.Form):
     )
     captcha = CaptchaField(label='کد امنیتی')
     
+    error_message = 'نام کاربری یا کلمه عبور اشتباه است'
+    
+    def __init__(self, *args, request=None, **kwargs):
+        self.request = request
+        self.user_cache = None
+        self.defer_authentication = False
+        super().__init__(*args, **kwargs)
+    
     def clean(self):
         cleaned_data = super().clean()
         username = cleaned_data.get('username')
         password = cleaned_data.get('password')
-        if username and password:
-            user = authenticate(username=username, password=password)
-            if not user:
-                raise forms.ValidationError('نام کاربری یا کلمه عبور اشتباه است')
+        if username and password and not self.defer_authentication:
+            # کاربر نگه داشته می‌شود تا view دوباره authenticate (و hash) انجام ندهد
+            self.user_cache = authenticate(self.request, username=username, password=password)
+            if not self.user_cache:
+                raise forms.ValidationError(self.error_message)
         return cleaned_data
+    
+    async def ais_valid(self):
+        """
+        نسخه async is_valid: فیلدها و captcha در thread همگام اعتبارسنجی می‌شوند و
+        رمز عبور با aauthenticate در thread pool hash بررسی می‌شود.
+        """
+        self.defer_authentication = True
+        if not await sync_to_async(self.is_valid)():
+            return False
+        self.user_cache = await aauthenticate(
+            self.request,
+            username=self.cleaned_data['username'],
+            password=self.cleaned_data['password']
+        )
+        if not self.user_cache:
+            self.add_error(None, self.error_message)
+            return False
+        return True
+    
+    def get_user(self):
+        return self.user_cache
 
 class ContactForm(forms.ModelForm):
     captcha = CaptchaField(label='کد امنیتی')
@@ -252,11 +307,13 @@ class UserToAdminMessageForm(forms.ModelForm):
         return message
 
 class AdminToUserMessageForm(forms.ModelForm):
+    # فقط شناسه کاربر ارسال می‌شود (از طریق autocomplete) و همان یک کاربر اعتبارسنجی می‌شود
+    user = forms.IntegerField(widget=forms.HiddenInput)
+    
     class Meta:
         model = UserMessage
         fields = ['user', 'subject', 'content', 'message_type']
         widgets = {
-            'user': forms.Select(attrs={'class': 'form-control'}),
             'subject': forms.TextInput(attrs={'class': 'form-control'}),
             'content': forms.Textarea(attrs={'class': 'form-control', 'rows': 6}),
             'message_type': forms.Select(attrs={'class': 'form-control'}),
@@ -264,11 +321,16 @@ class AdminToUserMessageForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['user'].queryset = CustomUser.objects.filter(is_staff=False)
         self.fields['user'].label = 'کاربر گیرنده'
         self.fields['subject'].label = 'موضوع پیام'
         self.fields['content'].label = 'متن پیام'
         self.fields['message_type'].label = 'نوع پیام'
+    
+    def clean_user(self):
+        user = CustomUser.objects.filter(pk=self.cleaned_data['user'], is_staff=False).first()
+        if user is None:
+            raise forms.ValidationError('کاربر انتخاب شده معتبر نیست')
+        return user
 
 
 class UserTypeUpdateForm(forms.ModelForm):
@@ -288,4 +350,82 @@ class UserTypeUpdateForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['user_type'].choices = CustomUser.USER_TYPE_CHOICES
\ No newline at end of file
+        self.fields['user_type'].choices = CustomUser.USER_TYPE_CHOICES
+
+
+class UserIdsField(forms.Field):
+    """لیست شناسه کاربران انتخاب شده (چک‌باکس‌های جدول کاربران)"""
+    widget = forms.MultipleHiddenInput
+    
+    def to_python(self, value):
+        try:
+            return sorted({int(user_id) for user_id in value or []})
+        except (TypeError, ValueError):
+            raise forms.ValidationError('شناسه کاربر معتبر نیست')
+
+
+class BulkUserActionForm(forms.Form):
+    """فرم عملیات گروهی روی کاربران انتخاب شده"""
+    ACTION_CHOICES = (
+        ('activate', 'فعال کردن'),
+        ('deactivate', 'غیرفعال کردن'),
+        ('set_type', 'تغییر نوع کاربر'),
+    )
+    MAX_USERS = 1000
+    
+    action = forms.ChoiceField(
+        choices=ACTION_CHOICES,
+        label='عملیات',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    user_type = forms.ChoiceField(
+        choices=(('', 'نوع کاربر...'),) + CustomUser.USER_TYPE_CHOICES,
+        required=False,
+        label='نوع کاربر',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    user_ids = UserIdsField(label='کاربران')
+    
+    def clean_user_ids(self):
+        user_ids = self.cleaned_data['user_ids']
+        if not user_ids:
+            raise forms.ValidationError('هیچ کاربری انتخاب نشده است')
+        if len(user_ids) > self.MAX_USERS:
+            raise forms.ValidationError(f'حداکثر {self.MAX_USERS} کاربر را می‌توان همزمان تغییر داد')
+        return user_ids
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == 'set_type' and not cleaned_data.get('user_type'):
+            self.add_error('user_type', 'نوع کاربر را انتخاب کنید')
+        return cleaned_data
+    
+    def get_fields(self):
+        """فیلدهایی که باید برای کاربران انتخاب شده تغییر کنند"""
+        action = self.cleaned_data['action']
+        if action == 'activate':
+            return {'is_active': True}
+        if action == 'deactivate':
+            return {'is_active': False}
+        return {'user_type': self.cleaned_data['user_type']}
+
+
+class BroadcastForm(forms.ModelForm):
+    """فرم ارسال پیام همگانی به گروهی از کاربران"""
+    class Meta:
+        model = Broadcast
+        fields = ['user_type', 'age_group', 'message_type', 'subject', 'content']
+        widgets = {
+            'user_type': forms.Select(attrs={'class': 'form-control'}),
+            'age_group': forms.Select(attrs={'class': 'form-control'}),
+            'message_type': forms.Select(attrs={'class': 'form-control'}),
+            'subject': forms.TextInput(attrs={'class': 'form-control'}),
+            'content': forms.Textarea(attrs={'class': 'form-control', 'rows': 6}),
+        }
+        labels = {
+            'user_type': 'نوع کاربر (خالی = همه)',
+            'age_group': 'گروه سنی (خالی = همه)',
+            'message_type': 'نوع پیام',
+            'subject': 'موضوع پیام',
+            'content': 'متن پیام',
+        }
@@ -0,0 +1,67 @@
+"""
+hash رمز عبور.
+
+ConfigurablePBKDF2PasswordHasher همان PBKDF2 پیش‌فرض Django است که تعداد
+تکرار آن با ACCOUNTS_PASSWORD_ITERATIONS تنظیم می‌شود. چون نام الگوریتم تغییر
+نمی‌کند، hashهای قبلی معتبر می‌مانند و با تغییر تعداد تکرار، رمز عبور کاربر
+در اولین ورود موفق با مقدار جدید دوباره hash می‌شود.
+
+viewهای async ورود و ثبت نام hash را در یک thread pool محدود
+(ACCOUNTS_HASHING_WORKERS، پیش‌فرض: تعداد هسته‌ها) اجرا می‌کنند تا event loop
+مشغول نشود و تعداد hashهای همزمان از تعداد هسته‌ها بیشتر نشود.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password, verify_password
+
+_lock = threading.Lock()
+_executor = None
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, 'ACCOUNTS_PASSWORD_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
+
+
+def get_hashing_workers():
+    return getattr(settings, 'ACCOUNTS_HASHING_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_hashing_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_hashing_workers(),
+                    thread_name_prefix='password-hash'
+                )
+    return _executor
+
+
+async def run_hashing(func, *args):
+    # hashlib در زمان محاسبه PBKDF2 قفل GIL را آزاد می‌کند، پس threadها واقعاً موازی اجرا می‌شوند
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hashing_executor(), functools.partial(func, *args))
+
+
+async def amake_password(password):
+    return await run_hashing(make_password, password)
+
+
+async def acheck_password(user, raw_password):
+    """
+    مثل user.acheck_password، ولی بررسی و hash دوباره رمز عبور در thread pool
+    انجام می‌شود. اگر hasher یا تعداد تکرار تغییر کرده باشد رمز عبور دوباره hash می‌شود.
+    """
+    is_correct, must_update = await run_hashing(verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = await amake_password(raw_password)
+        await user.asave(update_fields=['password'])
+    return is_correct
@@ -0,0 +1,119 @@
+"""
+صف کارهای پس‌زمینه مبتنی بر پایگاه داده.
+
+کارها با enqueue() در جدول Job ثبت می‌شوند (در همان تراکنش درخواست) و دستور
+run_jobs آن‌ها را اجرا می‌کند. handlerها با register_job ثبت می‌شوند؛ کارهای
+سنگین پردازنده‌ای (cpu_bound، مثل پردازش تصویر) در process pool اجرا می‌شوند
+تا worker و کارهای دیگر منتظر آن‌ها نمانند. کار ناموفق با تأخیر افزایشی تا
+max_attempts بار دوباره اجرا می‌شود و وضعیت آن در پنل ادمین قابل مشاهده است.
+کاری که worker آن وسط اجرا از کار افتاده هم یک تلاش حساب می‌شود؛ کارهای
+طولانی با stale_after در register_job آستانه بیشتری برای این تشخیص می‌گیرند.
+"""
+import datetime
+import logging
+import traceback
+
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+JOB_RETRY_DELAY = 30
+
+# نام کار -> (تابع، cpu_bound)
+JOB_HANDLERS = {}
+# نام کار -> ثانیه‌هایی که کار running بعد از آن رها شده حساب می‌شود
+JOB_STALE_AFTER = {}
+
+
+def register_job(name, cpu_bound=False, stale_after=None):
+    def decorator(func):
+        JOB_HANDLERS[name] = (func, cpu_bound)
+        if stale_after is not None:
+            JOB_STALE_AFTER[name] = stale_after
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=3, **payload):
+    """ثبت یک کار؛ تا commit تراکنش جاری برای worker قابل مشاهده نیست"""
+    from .models import Job
+    if name not in JOB_HANDLERS:
+        raise ValueError(f'کار ثبت نشده: {name}')
+    return Job.objects.create(name=name, payload=payload, max_attempts=max_attempts)
+
+
+def claim_jobs(limit):
+    """
+    برداشتن حداکثر limit کار آماده از صف. هر کار با یک UPDATE شرطی روی status
+    برداشته می‌شود تا اگر چند worker همزمان اجرا شوند، کاری دو بار اجرا نشود.
+    """
+    from .models import Job
+    now = timezone.now()
+    candidates = Job.objects.filter(status='pending', run_at__lte=now).order_by('run_at', 'pk')
+    claimed = []
+    for job in candidates[:limit]:
+        if Job.objects.filter(pk=job.pk, status='pending').update(
+            status='running', started_at=now, attempts=job.attempts + 1
+        ):
+            job.status = 'running'
+            job.attempts += 1
+            claimed.append(job)
+    return claimed
+
+
+def release_stale_jobs(stale_after):
+    """
+    برگرداندن کارهای running یک worker از کار افتاده به صف. stale_after آستانه
+    پیش‌فرض است و کارهایی که با stale_after ثبت شده‌اند آستانه خود را دارند.
+    هر برداشتن کار در claim_jobs یک تلاش شمرده شده است، پس کاری که تلاش‌هایش
+    تمام شده به جای برگشت به صف ناموفق می‌شود. تعداد کارهای برگشته را برمی‌گرداند.
+    """
+    from .models import Job
+    now = timezone.now()
+    running = Job.objects.filter(status='running')
+    stale = running.filter(
+        started_at__lt=now - datetime.timedelta(seconds=stale_after)
+    ).exclude(name__in=JOB_STALE_AFTER)
+    for name, seconds in JOB_STALE_AFTER.items():
+        stale = stale | running.filter(name=name, started_at__lt=now - datetime.timedelta(seconds=seconds))
+    stale_ids = list(stale.values_list('pk', flat=True))
+    if not stale_ids:
+        return 0
+    stale = Job.objects.filter(pk__in=stale_ids, status='running')
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, last_error='worker در حین اجرای کار متوقف شد'
+    )
+    if failed:
+        logger.error(f"{failed} کار نیمه‌تمام بعد از آخرین تلاش ناموفق شد")
+    return stale.update(status='pending')
+
+
+def execute_job(name, payload):
+    """اجرای handler یک کار؛ در process pool هم همین تابع فراخوانی می‌شود"""
+    close_old_connections()
+    func, _ = JOB_HANDLERS[name]
+    return func(**payload)
+
+
+def finish_job(job, error=None):
+    from .models import Job
+    now = timezone.now()
+    if error is None:
+        Job.objects.filter(pk=job.pk).update(status='done', finished_at=now, last_error='')
+        return
+    if job.attempts < job.max_attempts:
+        # تأخیر افزایشی: ۳۰ ثانیه، ۱ دقیقه، ۲ دقیقه، ...
+        delay = JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        Job.objects.filter(pk=job.pk).update(
+            status='pending', run_at=now + datetime.timedelta(seconds=delay), last_error=error
+        )
+        logger.warning(f"کار {job.name} #{job.pk} ناموفق بود (تلاش {job.attempts})، {delay} ثانیه بعد دوباره اجرا می‌شود")
+    else:
+        Job.objects.filter(pk=job.pk).update(status='failed', finished_at=now, last_error=error)
+        logger.error(f"کار {job.name} #{job.pk} بعد از {job.attempts} تلاش ناموفق ماند: {error.splitlines()[-1]}")
+
+
+def format_error(exc):
+    return ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))
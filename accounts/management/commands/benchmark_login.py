@@ -0,0 +1,61 @@
+import asyncio
+import os
+import time
+
+from django.contrib.auth import aauthenticate
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.hashers import acheck_password, get_hashing_workers
+from accounts.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'اندازه‌گیری تعداد ورود در ثانیه (و به ازای هر هسته) در مسیر async ورود؛ '
+        'بدون --username فقط بررسی رمز عبور یک کاربر موقت (بدون پایگاه داده) اندازه‌گیری می‌شود'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help='تعداد ورودهای همزمان')
+        parser.add_argument('--username', help='ورود کامل (با خواندن کاربر از پایگاه داده) با این کاربر')
+        parser.add_argument('--password', default='benchmark-password')
+
+    def handle(self, *args, **options):
+        logins = options['logins']
+        username = options['username']
+        password = options['password']
+        if logins < 1:
+            raise CommandError('تعداد ورودها باید حداقل ۱ باشد')
+
+        if username:
+            async def login():
+                return await aauthenticate(username=username, password=password) is not None
+        else:
+            user = CustomUser(username='benchmark', password=make_password(password))
+
+            async def login():
+                return await acheck_password(user, password)
+
+        async def run():
+            return await asyncio.gather(*(login() for _ in range(logins)))
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+
+        failed = results.count(False)
+        if failed == logins:
+            raise CommandError('هیچ ورودی موفق نبود؛ نام کاربری و رمز عبور را بررسی کنید')
+
+        hasher = get_hasher()
+        workers = get_hashing_workers()
+        cores = min(workers, os.cpu_count() or 1)
+        rate = logins / elapsed
+        self.stdout.write(
+            f'{logins} ورود در {elapsed:.2f} ثانیه ({failed} ناموفق)، '
+            f'{workers} thread hash، hasher {hasher.algorithm} ({getattr(hasher, "iterations", "-")} تکرار)'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{rate:.1f} ورود در ثانیه، {rate / cores:.1f} ورود در ثانیه به ازای هر هسته ({cores} هسته)'
+        ))
@@ -0,0 +1,201 @@
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import datetime
+import itertools
+import json
+import os
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from accounts.age_groups import assign_age_groups, local_today
+from accounts.forms import jalali_to_gregorian
+from accounts.models import CustomUser
+from accounts.stats import invalidate_dashboard_stats
+
+IMPORT_FIELDS = (
+    'username', 'national_code', 'phone_number', 'first_name', 'last_name',
+    'email', 'birth_date', 'user_type',
+)
+
+
+def _init_worker():
+    # در حالت spawn، processهای hash باید تنظیمات Django را خودشان بارگذاری کنند
+    django.setup()
+
+
+def _hash_password(password):
+    return make_password(password or None)
+
+
+class Command(BaseCommand):
+    help = 'ورود گروهی کاربران از فایل CSV یا JSONL (ستون‌ها: ' + ', '.join(IMPORT_FIELDS) + ', password)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='مسیر فایل CSV یا JSONL')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='پیش‌فرض: از روی پسوند فایل')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='تعداد processهای hash رمز عبور')
+        parser.add_argument('--rejects', help='فایل ردیف‌های رد شده (پیش‌فرض: <path>.rejects.csv)')
+        parser.add_argument('--user-type', default='normal', help='نوع کاربر برای ردیف‌های بدون user_type')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        rejects_path = options['rejects'] or f'{path}.rejects.csv'
+        self.default_user_type = options['user_type']
+        self.workers = options['workers']
+        self.today = local_today()
+        self.seen_usernames = set()
+        self.seen_national_codes = set()
+
+        try:
+            source = open(path, newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(f'خطا در باز کردن فایل: {e}')
+
+        imported = 0
+        self.rejected = 0
+        with source, open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_file, \
+                ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            self.rejects = csv.writer(rejects_file)
+            self.rejects.writerow(['line', 'errors', 'row'])
+            rows = self.read_csv(source) if file_format == 'csv' else self.read_jsonl(source)
+            while True:
+                chunk = list(itertools.islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                imported += self.import_chunk(chunk, executor)
+                self.stdout.write(f'{imported} کاربر وارد شد، {self.rejected} ردیف رد شد')
+
+        if imported:
+            invalidate_dashboard_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'ورود کاربران تمام شد: {imported} کاربر وارد شد، {self.rejected} ردیف رد شد.'
+        ))
+        if self.rejected:
+            self.stdout.write(self.style.WARNING(f'ردیف‌های رد شده در {rejects_path} ذخیره شدند.'))
+
+    def read_csv(self, source):
+        for line, row in enumerate(csv.DictReader(source), start=2):
+            yield line, row
+
+    def read_jsonl(self, source):
+        for line, text in enumerate(source, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+                if not isinstance(row, dict):
+                    raise ValueError('ردیف باید یک شیء JSON باشد')
+            except ValueError as e:
+                self.reject(line, text.strip(), [str(e)])
+                continue
+            yield line, row
+
+    def reject(self, line, row, errors):
+        raw = row if isinstance(row, str) else json.dumps(row, ensure_ascii=False)
+        self.rejects.writerow([line, ' | '.join(errors), raw])
+        self.rejected += 1
+
+    def parse_birth_date(self, value):
+        if not value:
+            return None
+        if '/' in value:
+            # تاریخ شمسی با همان فرمت فرم ثبت نام
+            parsed = jalali_to_gregorian(value)
+            birth_date = parsed.date() if parsed else None
+        else:
+            try:
+                birth_date = datetime.date.fromisoformat(value)
+            except ValueError:
+                birth_date = None
+        if birth_date is None:
+            raise ValidationError('تاریخ تولد معتبر نیست. فرمت صحیح: ۱۳۹۹/۰۱/۰۱ یا 2020-03-20')
+        if birth_date > self.today:
+            raise ValidationError('تاریخ تولد نمی‌تواند در آینده باشد')
+        return birth_date
+
+    def build_user(self, row):
+        """اعتبارسنجی ردیف با validatorهای فیلدهای CustomUser"""
+        values = {name: str(row.get(name) or '').strip() for name in IMPORT_FIELDS}
+        values['username'] = values['username'] or values['national_code']
+        values['user_type'] = values['user_type'] or self.default_user_type
+        errors = []
+        cleaned = {}
+        for name in IMPORT_FIELDS:
+            try:
+                if name == 'birth_date':
+                    cleaned[name] = self.parse_birth_date(values[name])
+                else:
+                    field = CustomUser._meta.get_field(name)
+                    cleaned[name] = field.clean(values[name] or (None if field.null else ''), None)
+            except ValidationError as e:
+                errors.extend(f'{name}: {message}' for message in e.messages)
+        if errors:
+            return None, str(row.get('password') or ''), errors
+
+        if cleaned['username'] in self.seen_usernames:
+            errors.append('username: تکراری در فایل')
+        if cleaned['national_code'] in self.seen_national_codes:
+            errors.append('national_code: تکراری در فایل')
+        if errors:
+            return None, '', errors
+        self.seen_usernames.add(cleaned['username'])
+        self.seen_national_codes.add(cleaned['national_code'])
+        return CustomUser(**cleaned), str(row.get('password') or ''), []
+
+    def import_chunk(self, chunk, executor):
+        candidates = []
+        for line, row in chunk:
+            user, password, errors = self.build_user(row)
+            if errors:
+                self.reject(line, row, errors)
+            else:
+                candidates.append((line, row, user, password))
+
+        # تکراری‌ها با یک کوئری برای کل بخش پیدا می‌شوند
+        existing_usernames = set(CustomUser.objects.filter(
+            username__in=[user.username for _, _, user, _ in candidates]
+        ).values_list('username', flat=True))
+        existing_national_codes = set(CustomUser.objects.filter(
+            national_code__in=[user.national_code for _, _, user, _ in candidates]
+        ).values_list('national_code', flat=True))
+
+        valid = []
+        for line, row, user, password in candidates:
+            errors = []
+            if user.username in existing_usernames:
+                errors.append('username: قبلاً ثبت شده است')
+            if user.national_code in existing_national_codes:
+                errors.append('national_code: قبلاً ثبت شده است')
+            if errors:
+                self.reject(line, row, errors)
+            else:
+                valid.append((line, row, user, password))
+        if not valid:
+            return 0
+
+        passwords = [password for _, _, _, password in valid]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        for (_, _, user, _), hashed in zip(valid, executor.map(_hash_password, passwords, chunksize=chunksize)):
+            user.password = hashed
+
+        users = [user for _, _, user, _ in valid]
+        try:
+            with transaction.atomic():
+                CustomUser.objects.bulk_create(users)
+                # برای backendهایی که شناسه ردیف‌های bulk_create را برنمی‌گردانند
+                user_ids = CustomUser.objects.filter(
+                    national_code__in=[user.national_code for user in users]
+                ).values_list('pk', flat=True)
+                assign_age_groups(CustomUser.objects.filter(pk__in=user_ids), today=self.today)
+        except IntegrityError as e:
+            # ثبت همزمان همین کاربران از جای دیگر؛ کل بخش رد می‌شود
+            for line, row, _, _ in valid:
+                self.reject(line, row, [f'خطای پایگاه داده: {e}'])
+            return 0
+        return len(users)
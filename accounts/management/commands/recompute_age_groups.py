@@ -0,0 +1,50 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.age_groups import crossed_age_boundary, local_today, stale_age_groups
+from accounts.models import CustomUser
+from accounts.user_actions import users_bulk_updated
+
+SIGNAL_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'به‌روزرسانی گروه سنی کاربرانی که وارد بازه سنی جدیدی شده‌اند '
+        '(یک UPDATE برای هر بازه؛ برای اجرای شبانه)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=7,
+            help='بررسی کاربرانی که در این چند روز اخیر از مرز سنی عبور کرده‌اند (پیش‌فرض: ۷ تا اجراهای جا افتاده هم پوشش داده شوند)'
+        )
+        parser.add_argument('--all', action='store_true', help='بررسی همه کاربران دارای تاریخ تولد')
+
+    def handle(self, *args, **options):
+        today = local_today()
+        users = CustomUser.objects.all()
+        if not options['all']:
+            since = today - datetime.timedelta(days=options['days'])
+            users = users.filter(crossed_age_boundary(since, today))
+
+        total = 0
+        for age_group, stale in stale_age_groups(users, today):
+            with transaction.atomic():
+                user_ids = list(stale.order_by().values_list('pk', flat=True))
+                if not user_ids:
+                    continue
+                updated = stale.update(age_group=age_group, updated_at=timezone.now())
+            total += updated
+            for start in range(0, len(user_ids), SIGNAL_BATCH_SIZE):
+                users_bulk_updated.send(
+                    sender=CustomUser,
+                    user_ids=user_ids[start:start + SIGNAL_BATCH_SIZE],
+                    fields={'age_group': age_group}
+                )
+            self.stdout.write(f'{updated} کاربر به گروه سنی {age_group} منتقل شد')
+
+        self.stdout.write(self.style.SUCCESS(f'گروه سنی {total} کاربر به‌روز شد.'))
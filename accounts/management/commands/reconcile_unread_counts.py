@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.backends import invalidate_cached_users
+from accounts.counters import invalidate_unread_counts
+from accounts.models import CustomUser, UserMessage
+
+
+class Command(BaseCommand):
+    help = 'بازسازی شمارنده پیام‌های خوانده نشده کاربران از روی جدول پیام‌ها'
+
+    def handle(self, *args, **options):
+        actual_unread = UserMessage.objects.filter(
+            user=OuterRef('pk'),
+            is_from_admin=True,
+            is_read=False
+        ).order_by().values('user').annotate(count=Count('id')).values('count')
+
+        drifted_ids = list(
+            CustomUser.objects.annotate(
+                actual_unread=Coalesce(Subquery(actual_unread), 0)
+            ).exclude(
+                unread_messages_count=F('actual_unread')
+            ).values_list('pk', flat=True)
+        )
+
+        if drifted_ids:
+            CustomUser.objects.filter(pk__in=drifted_ids).update(
+                unread_messages_count=Coalesce(Subquery(actual_unread), 0)
+            )
+            invalidate_unread_counts(drifted_ids)
+            invalidate_cached_users(drifted_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'شمارنده {len(drifted_ids)} کاربر اصلاح شد.'
+        ))
@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import time
+
+import django
+from django.core.management.base import BaseCommand
+
+from accounts.jobs import JOB_HANDLERS, claim_jobs, execute_job, finish_job, format_error, release_stale_jobs
+
+
+def _init_worker():
+    # processهای pool با spawn ساخته می‌شوند تا اتصال دیتابیس process اصلی در
+    # آن‌ها کپی نشود؛ پس تنظیمات Django را خودشان بارگذاری می‌کنند
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'اجرای کارهای پس‌زمینه صف Job (پردازش فایل‌های آپلود شده و ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='تعداد processهای کارهای سنگین (مثل پردازش تصویر)؛ ۰ یعنی اجرا در همین process'
+        )
+        parser.add_argument('--batch-size', type=int, default=10, help='تعداد کارهایی که هر بار برداشته می‌شوند')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='فاصله بررسی صف خالی (ثانیه)')
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help='کارهای running قدیمی‌تر از این (ثانیه) به صف برگردانده می‌شوند (worker از کار افتاده)'
+        )
+        parser.add_argument('--once', action='store_true', help='اجرای کارهای آماده و خروج')
+
+    def handle(self, *args, **options):
+        self.workers = options['workers']
+        self.executor = self.create_executor()
+        self.done = self.failed = 0
+        try:
+            while True:
+                released = release_stale_jobs(options['stale_after'])
+                if released:
+                    self.stdout.write(self.style.WARNING(f'{released} کار نیمه‌تمام به صف برگشت'))
+                jobs = claim_jobs(options['batch_size'])
+                if jobs:
+                    self.run_batch(jobs)
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'{self.done} کار انجام شد، {self.failed} کار ناموفق بود.'))
+
+    def create_executor(self):
+        if self.workers <= 0:
+            return None
+        return ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def run_batch(self, jobs):
+        futures = []
+        broken = False
+        for job in jobs:
+            if job.name not in JOB_HANDLERS:
+                # تلاش دوباره فایده‌ای ندارد
+                job.attempts = job.max_attempts
+                self.finish(job, f'کار ثبت نشده: {job.name}')
+                continue
+            _, cpu_bound = JOB_HANDLERS[job.name]
+            if cpu_bound and self.executor is not None:
+                try:
+                    futures.append((job, self.executor.submit(execute_job, job.name, job.payload)))
+                except BrokenProcessPool as e:
+                    broken = True
+                    self.finish(job, format_error(e))
+                continue
+            try:
+                execute_job(job.name, job.payload)
+            except Exception as e:
+                self.finish(job, format_error(e))
+            else:
+                self.finish(job)
+
+        for job, future in futures:
+            try:
+                future.result()
+            except BrokenProcessPool as e:
+                # یکی از processها از کار افتاده (مثلاً کمبود حافظه)؛ کارهای در جریان
+                # pool با تأخیر دوباره اجرا می‌شوند
+                broken = True
+                self.finish(job, format_error(e))
+            except Exception as e:
+                self.finish(job, format_error(e))
+            else:
+                self.finish(job)
+
+        if broken:
+            # pool خراب دیگر کاری قبول نمی‌کند و باید از نو ساخته شود
+            self.stdout.write(self.style.WARNING('process pool از کار افتاد و دوباره ساخته می‌شود'))
+            self.executor.shutdown(wait=False)
+            self.executor = self.create_executor()
+
+    def finish(self, job, error=None):
+        finish_job(job, error)
+        if error is None:
+            self.done += 1
+        else:
+            self.failed += 1
+            self.stdout.write(self.style.ERROR(f'کار {job.name} #{job.pk} ناموفق بود (تلاش {job.attempts})'))
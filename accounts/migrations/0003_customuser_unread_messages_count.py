@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 19:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_unread_messages_count(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    UserMessage = apps.get_model('accounts', 'UserMessage')
+    unread = UserMessage.objects.filter(
+        user=OuterRef('pk'),
+        is_from_admin=True,
+        is_read=False
+    ).order_by().values('user').annotate(count=Count('id')).values('count')
+    CustomUser.objects.update(unread_messages_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_customuser_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='unread_messages_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='پیام‌های خوانده نشده'),
+        ),
+        migrations.RunPython(populate_unread_messages_count, migrations.RunPython.noop),
+    ]
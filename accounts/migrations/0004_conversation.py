@@ -0,0 +1,92 @@
+# Generated by Django 6.0 on 2026-10-17 19:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def assign_conversations(apps, schema_editor):
+    Conversation = apps.get_model('accounts', 'Conversation')
+    UserMessage = apps.get_model('accounts', 'UserMessage')
+    
+    contact_threads = UserMessage.objects.filter(
+        contact_message__isnull=False
+    ).values('contact_message', 'contact_message__user').distinct()
+    for thread in contact_threads.iterator():
+        conversation = Conversation.objects.create(
+            kind='contact',
+            user_id=thread['contact_message__user'],
+            contact_message_id=thread['contact_message']
+        )
+        UserMessage.objects.filter(
+            contact_message_id=thread['contact_message']
+        ).update(conversation=conversation)
+    
+    direct_user_ids = UserMessage.objects.filter(
+        contact_message__isnull=True
+    ).values_list('user', flat=True).distinct()
+    for user_id in direct_user_ids.iterator():
+        conversation = Conversation.objects.create(kind='direct', user_id=user_id)
+        UserMessage.objects.filter(
+            contact_message__isnull=True,
+            user_id=user_id
+        ).update(conversation=conversation)
+    
+    for conversation in Conversation.objects.iterator():
+        messages = UserMessage.objects.filter(conversation=conversation)
+        stats = messages.aggregate(count=Count('id'), last=Max('created_at'))
+        conversation.message_count = stats['count']
+        conversation.last_message_at = stats['last']
+        conversation.save(update_fields=['message_count', 'last_message_at'])
+        participant_ids = {conversation.user_id}
+        participant_ids.update(
+            messages.filter(sender__isnull=False).values_list('sender', flat=True).distinct()
+        )
+        conversation.participants.add(*participant_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_unread_messages_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('contact', 'پیام تماس'), ('direct', 'پیام مستقیم')], default='direct', max_length=10, verbose_name='نوع گفتگو')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان آخرین پیام')),
+                ('message_count', models.PositiveIntegerField(default=0, verbose_name='تعداد پیام\u200cها')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('contact_message', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversation', to='accounts.contactmessage', verbose_name='پیام تماس')),
+                ('participants', models.ManyToManyField(blank=True, related_name='participating_conversations', to=settings.AUTH_USER_MODEL, verbose_name='شرکت\u200cکنندگان')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'گفتگو',
+                'verbose_name_plural': 'گفتگوها',
+                'ordering': ['-last_message_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='usermessage',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='accounts.conversation', verbose_name='گفتگو'),
+        ),
+        migrations.AddIndex(
+            model_name='usermessage',
+            index=models.Index(fields=['conversation', 'created_at'], name='accounts_us_convers_9695ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user', 'last_message_at'], name='accounts_co_user_id_a1c8bb_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'direct')), fields=('user',), name='unique_direct_conversation_per_user'),
+        ),
+        migrations.RunPython(assign_conversations, migrations.RunPython.noop),
+    ]
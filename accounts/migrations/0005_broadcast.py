@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-17 19:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_conversation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200, verbose_name='موضوع')),
+                ('content', models.TextField(verbose_name='محتوا')),
+                ('message_type', models.CharField(choices=[('contact', 'پیام تماس'), ('response', 'پاسخ ادمین'), ('private', 'پیام خصوصی')], default='private', max_length=20, verbose_name='نوع پیام')),
+                ('user_type', models.CharField(blank=True, choices=[('normal', 'کاربر عادی'), ('worker', 'کارگر'), ('employee', 'کارمند')], max_length=10, verbose_name='نوع کاربر گیرنده')),
+                ('age_group', models.CharField(blank=True, choices=[('under_7', 'زیر ۷ سال'), ('7_15', '۷ تا ۱۵ سال'), ('15_25', '۱۵ تا ۲۵ سال'), ('over_25', 'بالای ۲۵ سال')], max_length=10, verbose_name='گروه سنی گیرنده')),
+                ('status', models.CharField(choices=[('pending', 'در صف ارسال'), ('running', 'در حال ارسال'), ('done', 'ارسال شده'), ('failed', 'ناموفق')], default='pending', max_length=10, verbose_name='وضعیت')),
+                ('total_recipients', models.PositiveIntegerField(default=0, verbose_name='تعداد گیرندگان')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='تعداد ارسال شده')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ پایان')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='broadcasts', to=settings.AUTH_USER_MODEL, verbose_name='ایجاد کننده')),
+            ],
+            options={
+                'verbose_name': 'پیام همگانی',
+                'verbose_name_plural': 'پیام\u200cهای همگانی',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
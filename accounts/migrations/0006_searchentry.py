@@ -0,0 +1,118 @@
+# Generated by Django 6.0 on 2026-10-17 19:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+SQLITE_FULLTEXT_SQL = [
+    "CREATE VIRTUAL TABLE accounts_searchentry_fts USING fts5("
+    "subject, body, content='accounts_searchentry', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER accounts_searchentry_fts_ai AFTER INSERT ON accounts_searchentry BEGIN "
+    "INSERT INTO accounts_searchentry_fts(rowid, subject, body) VALUES (new.id, new.subject, new.body); "
+    "END",
+    "CREATE TRIGGER accounts_searchentry_fts_ad AFTER DELETE ON accounts_searchentry BEGIN "
+    "INSERT INTO accounts_searchentry_fts(accounts_searchentry_fts, rowid, subject, body) "
+    "VALUES ('delete', old.id, old.subject, old.body); "
+    "END",
+    "CREATE TRIGGER accounts_searchentry_fts_au AFTER UPDATE ON accounts_searchentry BEGIN "
+    "INSERT INTO accounts_searchentry_fts(accounts_searchentry_fts, rowid, subject, body) "
+    "VALUES ('delete', old.id, old.subject, old.body); "
+    "INSERT INTO accounts_searchentry_fts(rowid, subject, body) VALUES (new.id, new.subject, new.body); "
+    "END",
+]
+
+SQLITE_FULLTEXT_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS accounts_searchentry_fts_au",
+    "DROP TRIGGER IF EXISTS accounts_searchentry_fts_ad",
+    "DROP TRIGGER IF EXISTS accounts_searchentry_fts_ai",
+    "DROP TABLE IF EXISTS accounts_searchentry_fts",
+]
+
+POSTGRESQL_FULLTEXT_SQL = [
+    "CREATE INDEX accounts_searchentry_fts_idx ON accounts_searchentry USING GIN "
+    "(to_tsvector('simple', coalesce(subject, '') || ' ' || coalesce(body, '')))",
+]
+
+POSTGRESQL_FULLTEXT_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS accounts_searchentry_fts_idx",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_FULLTEXT_SQL, 'postgresql': POSTGRESQL_FULLTEXT_SQL}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_FULLTEXT_REVERSE_SQL, 'postgresql': POSTGRESQL_FULLTEXT_REVERSE_SQL}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def populate_search_entries(apps, schema_editor):
+    SearchEntry = apps.get_model('accounts', 'SearchEntry')
+    ContactMessage = apps.get_model('accounts', 'ContactMessage')
+    UserMessage = apps.get_model('accounts', 'UserMessage')
+    
+    entries = []
+    
+    def flush(force=False):
+        if entries and (force or len(entries) >= 1000):
+            SearchEntry.objects.bulk_create(entries)
+            entries.clear()
+    
+    for contact_message in ContactMessage.objects.iterator(chunk_size=1000):
+        flush()
+        entries.append(SearchEntry(
+            kind='contact',
+            object_id=contact_message.pk,
+            user_id=contact_message.user_id,
+            subject=contact_message.subject,
+            body='\n'.join(filter(None, [contact_message.message, contact_message.admin_response])),
+            created_at=contact_message.created_at,
+        ))
+    for message in UserMessage.objects.iterator(chunk_size=1000):
+        flush()
+        entries.append(SearchEntry(
+            kind='message',
+            object_id=message.pk,
+            user_id=message.user_id,
+            subject=message.subject,
+            body=message.content,
+            created_at=message.created_at,
+        ))
+    flush(force=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_broadcast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('contact', 'پیام تماس'), ('message', 'پیام کاربر')], max_length=10, verbose_name='نوع')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='شناسه')),
+                ('subject', models.CharField(blank=True, max_length=200, verbose_name='موضوع')),
+                ('body', models.TextField(blank=True, verbose_name='متن')),
+                ('created_at', models.DateTimeField(verbose_name='تاریخ ایجاد')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'سند جستجو',
+                'verbose_name_plural': 'اسناد جستجو',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_entry_per_object')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(populate_search_entries, migrations.RunPython.noop),
+    ]
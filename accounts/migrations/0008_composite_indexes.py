@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-17 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_user_search_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='broadcast',
+            index=models.Index(fields=['created_at'], name='accounts_br_created_9bd153_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['status', 'created_at'], name='accounts_co_status_7d25f3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['user', 'created_at'], name='accounts_co_user_id_213e4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['created_at'], name='accounts_co_created_7bb7ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['user_type', 'date_joined'], name='accounts_cu_user_ty_ffd881_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['is_staff', 'date_joined'], name='accounts_cu_is_staf_32705b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['date_joined'], name='accounts_cu_date_jo_fcefff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermessage',
+            index=models.Index(fields=['user', 'is_from_admin', 'created_at'], name='accounts_us_user_id_89cb71_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermessage',
+            index=models.Index(condition=models.Q(('is_from_admin', False), ('is_read', False)), fields=['message_type'], name='accounts_us_pending_idx'),
+        ),
+    ]
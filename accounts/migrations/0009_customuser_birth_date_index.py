@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='birth_date',
+            field=models.DateField(blank=True, db_index=True, null=True, verbose_name='تاریخ تولد'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-17 20:04
+
+import accounts.models
+import accounts.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='نام فایل')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='تعداد ارجاع')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+            ],
+            options={
+                'verbose_name': 'فایل ذخیره شده',
+                'verbose_name_plural': 'فایل\u200cهای ذخیره شده',
+            },
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='job_document',
+            field=models.FileField(blank=True, null=True, storage=accounts.storage.ContentAddressedStorage(), upload_to='documents/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png'])], verbose_name='مستند شغلی'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_image',
+            field=models.ImageField(blank=True, default='profile_images/default_profile.jpg', null=True, storage=accounts.storage.ContentAddressedStorage(), upload_to=accounts.models.user_profile_image_path, verbose_name='عکس پروفایل'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0 on 2026-10-17 21:10
+
+from django.db import migrations
+
+# جستجوی متن کامل کاربران. این migration باید بعد از آخرین AlterField روی
+# CustomUser بیاید: SQLite برای AlterField جدول را از نو می‌سازد (0009 و 0011) و
+# triggerهای جدول قبلی همراه آن حذف می‌شوند
+
+SQLITE_FULLTEXT_SQL = [
+    "CREATE VIRTUAL TABLE accounts_customuser_fts USING fts5("
+    "first_name, last_name, username, content='accounts_customuser', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER accounts_customuser_fts_ai AFTER INSERT ON accounts_customuser BEGIN "
+    "INSERT INTO accounts_customuser_fts(rowid, first_name, last_name, username) "
+    "VALUES (new.id, new.first_name, new.last_name, new.username); "
+    "END",
+    "CREATE TRIGGER accounts_customuser_fts_ad AFTER DELETE ON accounts_customuser BEGIN "
+    "INSERT INTO accounts_customuser_fts(accounts_customuser_fts, rowid, first_name, last_name, username) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.username); "
+    "END",
+    "CREATE TRIGGER accounts_customuser_fts_au AFTER UPDATE OF first_name, last_name, username "
+    "ON accounts_customuser BEGIN "
+    "INSERT INTO accounts_customuser_fts(accounts_customuser_fts, rowid, first_name, last_name, username) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.username); "
+    "INSERT INTO accounts_customuser_fts(rowid, first_name, last_name, username) "
+    "VALUES (new.id, new.first_name, new.last_name, new.username); "
+    "END",
+    "INSERT INTO accounts_customuser_fts(accounts_customuser_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FULLTEXT_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS accounts_customuser_fts_au",
+    "DROP TRIGGER IF EXISTS accounts_customuser_fts_ad",
+    "DROP TRIGGER IF EXISTS accounts_customuser_fts_ai",
+    "DROP TABLE IF EXISTS accounts_customuser_fts",
+]
+
+POSTGRESQL_FULLTEXT_SQL = [
+    "CREATE INDEX accounts_customuser_fts_idx ON accounts_customuser USING GIN "
+    "(to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '') "
+    "|| ' ' || coalesce(username, '')))",
+]
+
+POSTGRESQL_FULLTEXT_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS accounts_customuser_fts_idx",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_FULLTEXT_SQL, 'postgresql': POSTGRESQL_FULLTEXT_SQL}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_FULLTEXT_REVERSE_SQL, 'postgresql': POSTGRESQL_FULLTEXT_REVERSE_SQL}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
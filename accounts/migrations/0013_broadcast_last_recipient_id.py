@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_user_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast',
+            name='last_recipient_id',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='شناسه آخرین گیرنده'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 21:01
+
+import accounts.models
+import accounts.storage
+import django.core.validators
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_broadcast_last_recipient_id'),
+    ]
+
+    # فقط کلاس Python فیلدها عوض می‌شود و ستون‌ها همان varchar هستند؛ بدون
+    # SeparateDatabaseAndState، SQLite جدول کاربران را از نو می‌سازد
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='customuser',
+                    name='job_document',
+                    field=accounts.storage.ContentFileField(blank=True, null=True, storage=accounts.storage.ContentAddressedStorage(), upload_to='documents/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png'])], verbose_name='مستند شغلی'),
+                ),
+                migrations.AlterField(
+                    model_name='customuser',
+                    name='profile_image',
+                    field=accounts.storage.ContentImageField(blank=True, default='profile_images/default_profile.jpg', null=True, storage=accounts.storage.ContentAddressedStorage(), upload_to=accounts.models.user_profile_image_path, verbose_name='عکس پروفایل'),
+                ),
+            ],
+        ),
+    ]
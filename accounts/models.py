@@ -1,10 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator, FileExtensionValidator
 from django.utils import timezone
 import os
 import jdatetime
 
+from .age_groups import age_group_for, local_today
+from .storage import ContentFileField, ContentImageField, content_storage
+from .thumbnails import PROFILE_THUMBNAIL_SIZES
+
 def user_profile_image_path(instance, filename):
     ext = filename.split('.')[-1]
     filename = f'profile_{instance.username}_{instance.id}.{ext}'
@@ -36,8 +41,9 @@ class CustomUser(AbstractUser):
         verbose_name='کد ملی'
     )
     
-    profile_image = models.ImageField(
+    profile_image = ContentImageField(
         upload_to=user_profile_image_path,
+        storage=content_storage,
         blank=True,
         null=True,
         verbose_name='عکس پروفایل',
@@ -60,8 +66,9 @@ class CustomUser(AbstractUser):
     )
     
     address = models.TextField(blank=True, null=True, verbose_name='آدرس')
-    job_document = models.FileField(
+    job_document = ContentFileField(
         upload_to='documents/',
+        storage=content_storage,
         blank=True,
         null=True,
         verbose_name='مستند شغلی',
@@ -74,6 +81,7 @@ class CustomUser(AbstractUser):
         max_length=11,
         blank=True,
         null=True,
+        db_index=True,
         validators=[
             RegexValidator(
                 regex='^09[0-9]{9}$',
@@ -86,12 +94,15 @@ class CustomUser(AbstractUser):
     birth_date = models.DateField(
         blank=True,
         null=True,
+        db_index=True,
         verbose_name='تاریخ تولد'
     )
     
     bio = models.TextField(blank=True, null=True, verbose_name='درباره من', max_length=500)
     website = models.URLField(blank=True, null=True, verbose_name='وبسایت')
     
+    unread_messages_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='پیام‌های خوانده نشده')
+    
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='آخرین به‌روزرسانی')
     
@@ -99,6 +110,12 @@ class CustomUser(AbstractUser):
         verbose_name = 'کاربر'
         verbose_name_plural = 'کاربران'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['email'], name='accounts_user_email_idx'),
+            models.Index(fields=['user_type', 'date_joined']),
+            models.Index(fields=['is_staff', 'date_joined']),
+            models.Index(fields=['date_joined']),
+        ]
     
     def __str__(self):
         return f"{self.get_full_name()} - {self.national_code}"
@@ -111,21 +128,32 @@ class CustomUser(AbstractUser):
     
     def calculate_age(self):
         if self.birth_date:
-            today = timezone.now().date()
+            today = local_today()
             age = today.year - self.birth_date.year
             if today.month < self.birth_date.month or (today.month == self.birth_date.month and today.day < self.birth_date.day):
                 age -= 1
             return age
         return None
     
-    def get_profile_image_url(self):
-        if self.profile_image and hasattr(self.profile_image, 'url') and self.profile_image.name:
-            try:
-                return self.profile_image.url
-            except:
-                pass
+    def get_profile_image_url(self, size=None, image_format='jpeg'):
+        # از طریق profile_image_view ارسال می‌شود تا ETag/Last-Modified داشته باشد؛
+        # با size آدرس تصویر کوچک (thumbnails.PROFILE_THUMBNAIL_SIZES) برگردانده می‌شود
+        if self.pk and self.profile_image and self.profile_image.name:
+            from django.urls import reverse
+            if size:
+                return reverse('profile_image_thumbnail', args=[self.pk, size, image_format])
+            return reverse('profile_image', args=[self.pk])
         return '/static/images/default_profile.jpg'
     
+    def get_profile_image_srcset(self, image_format='jpeg'):
+        """مقدار srcset همه اندازه‌های تصویر کوچک عکس پروفایل"""
+        if not (self.pk and self.profile_image and self.profile_image.name):
+            return ''
+        return ', '.join(
+            f'{self.get_profile_image_url(size, image_format)} {size}w'
+            for size in PROFILE_THUMBNAIL_SIZES
+        )
+    
     def get_birth_date_jalali(self):
         if self.birth_date:
             jalali_date = jdatetime.date.fromgregorian(date=self.birth_date)
@@ -134,18 +162,23 @@ class CustomUser(AbstractUser):
     
     def save(self, *args, **kwargs):
         if self.birth_date and not self.age_group:
-            age = self.calculate_age()
-            if age is not None:
-                if age < 7:
-                    self.age_group = 'under_7'
-                elif 7 <= age < 15:
-                    self.age_group = '7_15'
-                elif 15 <= age < 25:
-                    self.age_group = '15_25'
-                else:
-                    self.age_group = 'over_25'
+            self.age_group = age_group_for(self.birth_date)
         super().save(*args, **kwargs)
 
+def original_message_subquery(contact_message_ref):
+    """اولین پیام کاربر (پیام اصلی) برای یک پیام تماس، به صورت subquery"""
+    return Subquery(
+        UserMessage.objects.filter(
+            contact_message=contact_message_ref,
+            is_from_admin=False
+        ).order_by('created_at', 'id').values('id')[:1]
+    )
+
+class ContactMessageQuerySet(models.QuerySet):
+    def with_original_message(self):
+        """افزودن original_message_id به هر پیام تماس با یک کوئری"""
+        return self.annotate(original_message_id=original_message_subquery(OuterRef('pk')))
+
 class ContactMessage(models.Model):
     STATUS_CHOICES = (
         ('pending', 'در انتظار'),
@@ -167,10 +200,17 @@ class ContactMessage(models.Model):
     admin_response = models.TextField(blank=True, null=True, verbose_name='پاسخ ادمین')
     responded_at = models.DateTimeField(blank=True, null=True, verbose_name='تاریخ پاسخ')
     
+    objects = ContactMessageQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'پیام تماس'
         verbose_name_plural = 'پیام‌های تماس'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.subject}"
@@ -187,6 +227,153 @@ class ContactMessage(models.Model):
             return jalali_datetime.strftime('%Y/%m/%d - %H:%M')
         return ''
 
+class ConversationQuerySet(models.QuerySet):
+    def for_message(self, message):
+        """گفتگوی یک پیام: گفتگوی پیام تماس مرتبط، یا گفتگوی مستقیم کاربر با ادمین"""
+        if message.contact_message_id:
+            conversation, created = self.get_or_create(
+                contact_message_id=message.contact_message_id,
+                defaults={'kind': 'contact', 'user_id': message.user_id}
+            )
+        else:
+            conversation, created = self.get_or_create(
+                user_id=message.user_id,
+                kind='direct'
+            )
+        return conversation
+    
+    def direct_for_users(self, user_ids):
+        """شناسه گفتگوی مستقیم هر کاربر؛ گفتگوهای موجود نبوده با یک bulk_create ساخته می‌شوند"""
+        conversation_ids = dict(
+            self.filter(kind='direct', user_id__in=user_ids).values_list('user_id', 'id')
+        )
+        missing_ids = [user_id for user_id in user_ids if user_id not in conversation_ids]
+        if missing_ids:
+            self.bulk_create(
+                [self.model(kind='direct', user_id=user_id) for user_id in missing_ids],
+                ignore_conflicts=True
+            )
+            conversation_ids.update(
+                self.filter(kind='direct', user_id__in=missing_ids).values_list('user_id', 'id')
+            )
+        return conversation_ids
+
+class Conversation(models.Model):
+    KIND_CHOICES = (
+        ('contact', 'پیام تماس'),
+        ('direct', 'پیام مستقیم'),
+    )
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='direct', verbose_name='نوع گفتگو')
+    
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        verbose_name='کاربر',
+        related_name='conversations'
+    )
+    
+    contact_message = models.OneToOneField(
+        ContactMessage,
+        on_delete=models.CASCADE,
+        verbose_name='پیام تماس',
+        null=True,
+        blank=True,
+        related_name='conversation'
+    )
+    
+    participants = models.ManyToManyField(
+        CustomUser,
+        blank=True,
+        verbose_name='شرکت‌کنندگان',
+        related_name='participating_conversations'
+    )
+    
+    last_message_at = models.DateTimeField(blank=True, null=True, verbose_name='زمان آخرین پیام')
+    message_count = models.PositiveIntegerField(default=0, verbose_name='تعداد پیام‌ها')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    
+    objects = ConversationQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'گفتگو'
+        verbose_name_plural = 'گفتگوها'
+        ordering = ['-last_message_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(kind='direct'),
+                name='unique_direct_conversation_per_user'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_message_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.get_kind_display()}"
+
+class UserMessageQuerySet(models.QuerySet):
+    def with_original_message(self):
+        """افزودن original_message_id (پیام اصلی تماس مرتبط) به هر پیام"""
+        return self.annotate(original_message_id=original_message_subquery(OuterRef('contact_message')))
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        """پیام‌های ادمین بدون فرستنده، فرستنده سیستمی را می‌گیرند (یک بار برای همه ردیف‌ها)"""
+        from .senders import get_system_sender_id
+        
+        objs = list(objs)
+        if any(obj.is_from_admin and not obj.sender_id for obj in objs):
+            sender_id = get_system_sender_id()
+            for obj in objs:
+                if obj.is_from_admin and not obj.sender_id:
+                    obj.sender_id = sender_id
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def bulk_send(self, user_ids, **fields):
+        """
+        ارسال یک پیام به چند کاربر با یک bulk_create.
+
+        گفتگوی مستقیم هر کاربر، تعداد پیام‌های گفتگوها و شمارنده پیام‌های
+        خوانده نشده به صورت گروهی به‌روز می‌شوند؛ سیگنال‌های post_save
+        برای این پیام‌ها اجرا نمی‌شوند.
+        """
+        from .counters import adjust_unread_count
+        from .notifications import notify_new_messages
+        from .search import index_entries, user_message_entry
+        from .stats import invalidate_dashboard_stats
+        
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        
+        with transaction.atomic():
+            conversation_ids = Conversation.objects.direct_for_users(user_ids)
+            messages = self.bulk_create([
+                self.model(user_id=user_id, conversation_id=conversation_ids[user_id], **fields)
+                for user_id in user_ids
+            ])
+            
+            Conversation.objects.filter(pk__in=conversation_ids.values()).update(
+                message_count=F('message_count') + 1,
+                last_message_at=max(message.created_at for message in messages)
+            )
+            
+            Participant = Conversation.participants.through
+            sender_id = messages[0].sender_id
+            Participant.objects.bulk_create([
+                Participant(conversation_id=conversation_ids[user_id], customuser_id=participant_id)
+                for user_id in user_ids
+                for participant_id in {user_id, sender_id} - {None}
+            ], ignore_conflicts=True)
+            
+            if messages[0].counts_as_unread:
+                adjust_unread_count(user_ids, 1)
+            index_entries([user_message_entry(message) for message in messages if message.pk])
+            notify_new_messages(messages)
+            invalidate_dashboard_stats()
+        return messages
+
 class UserMessage(models.Model):
     MESSAGE_TYPE_CHOICES = (
         ('contact', 'پیام تماس'),
@@ -226,6 +413,17 @@ class UserMessage(models.Model):
         related_name='sent_user_messages'
     )
     
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        verbose_name='گفتگو',
+        null=True,
+        blank=True,
+        related_name='messages'
+    )
+    
+    objects = UserMessageQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'پیام کاربر'
         verbose_name_plural = 'پیام‌های کاربران'
@@ -234,12 +432,33 @@ class UserMessage(models.Model):
             models.Index(fields=['user', 'is_read']),
             models.Index(fields=['created_at']),
             models.Index(fields=['is_from_admin']),
+            models.Index(fields=['conversation', 'created_at']),
+            models.Index(fields=['user', 'is_from_admin', 'created_at']),
+            # پیام‌های خوانده نشده کاربران به ادمین (شمارنده‌های داشبورد)
+            models.Index(
+                fields=['message_type'],
+                condition=models.Q(is_from_admin=False, is_read=False),
+                name='accounts_us_pending_idx'
+            ),
         ]
     
     def __str__(self):
         return f"{self.user.username} - {self.subject}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # وضعیت شمارش خوانده نشده در زمان بارگذاری، برای به‌روزرسانی شمارنده در سیگنال‌ها
+        instance._counted_as_unread = instance.counts_as_unread
+        return instance
+    
+    @property
+    def counts_as_unread(self):
+        return self.is_from_admin and not self.is_read
+    
     def mark_as_read(self):
+        if self.is_read:
+            return
         self.is_read = True
         self.save(update_fields=['is_read'])
     
@@ -257,8 +476,184 @@ class UserMessage(models.Model):
         return ''
     
     def save(self, *args, **kwargs):
-        if self.is_from_admin and not self.sender:
-            admin_user = CustomUser.objects.filter(is_staff=True).first()
-            if admin_user:
-                self.sender = admin_user
-        super().save(*args, **kwargs)
\ No newline at end of file
+        if self.is_from_admin and not self.sender_id:
+            from .senders import get_system_sender_id
+            self.sender_id = get_system_sender_id()
+        if self.conversation_id is None and self._state.adding:
+            self.conversation = Conversation.objects.for_message(self)
+        super().save(*args, **kwargs)
+
+class Broadcast(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'در صف ارسال'),
+        ('running', 'در حال ارسال'),
+        ('done', 'ارسال شده'),
+        ('failed', 'ناموفق'),
+    )
+    
+    subject = models.CharField(max_length=200, verbose_name='موضوع')
+    content = models.TextField(verbose_name='محتوا')
+    message_type = models.CharField(
+        max_length=20,
+        choices=UserMessage.MESSAGE_TYPE_CHOICES,
+        default='private',
+        verbose_name='نوع پیام'
+    )
+    
+    user_type = models.CharField(
+        max_length=10,
+        choices=CustomUser.USER_TYPE_CHOICES,
+        blank=True,
+        verbose_name='نوع کاربر گیرنده'
+    )
+    age_group = models.CharField(
+        max_length=10,
+        choices=CustomUser.AGE_GROUP_CHOICES,
+        blank=True,
+        verbose_name='گروه سنی گیرنده'
+    )
+    
+    created_by = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='ایجاد کننده',
+        related_name='broadcasts'
+    )
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='وضعیت')
+    total_recipients = models.PositiveIntegerField(default=0, verbose_name='تعداد گیرندگان')
+    sent_count = models.PositiveIntegerField(default=0, verbose_name='تعداد ارسال شده')
+    # نقطه ادامه ارسال بعد از خطا یا از کار افتادن worker
+    last_recipient_id = models.PositiveBigIntegerField(default=0, verbose_name='شناسه آخرین گیرنده')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name='تاریخ پایان')
+    
+    class Meta:
+        verbose_name = 'پیام همگانی'
+        verbose_name_plural = 'پیام‌های همگانی'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return self.subject
+    
+    def get_recipients(self):
+        recipients = CustomUser.objects.filter(is_active=True, is_staff=False)
+        if self.user_type:
+            recipients = recipients.filter(user_type=self.user_type)
+        if self.age_group:
+            recipients = recipients.filter(age_group=self.age_group)
+        return recipients
+    
+    @property
+    def progress_percent(self):
+        if not self.total_recipients:
+            return 100 if self.status == 'done' else 0
+        return min(100, self.sent_count * 100 // self.total_recipients)
+    
+    def get_created_at_jalali(self):
+        if self.created_at:
+            jalali_datetime = jdatetime.datetime.fromgregorian(datetime=self.created_at)
+            return jalali_datetime.strftime('%Y/%m/%d - %H:%M')
+        return ''
+
+class SearchEntry(models.Model):
+    """
+    سند قابل جستجوی متنی برای پیام‌ها؛ کاربران ایندکس متنی جداگانه دارند (مایگریشن 0012).
+
+    روی SQLite یک جدول FTS5 و روی PostgreSQL یک ایندکس GIN از نوع tsvector
+    روی این جدول ساخته می‌شود (مایگریشن 0006)؛ محتوا توسط سیگنال‌ها همگام می‌ماند.
+    """
+    KIND_CHOICES = (
+        ('contact', 'پیام تماس'),
+        ('message', 'پیام کاربر'),
+    )
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='نوع')
+    object_id = models.PositiveBigIntegerField(verbose_name='شناسه')
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name='کاربر',
+        related_name='+'
+    )
+    subject = models.CharField(max_length=200, blank=True, verbose_name='موضوع')
+    body = models.TextField(blank=True, verbose_name='متن')
+    created_at = models.DateTimeField(verbose_name='تاریخ ایجاد')
+    
+    class Meta:
+        verbose_name = 'سند جستجو'
+        verbose_name_plural = 'اسناد جستجو'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_entry_per_object'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.subject}"
+
+
+class Job(models.Model):
+    """
+    کار پس‌زمینه (مثل پردازش فایل‌های آپلود شده) که توسط دستور run_jobs اجرا
+    می‌شود؛ handlerها در accounts/jobs.py ثبت می‌شوند.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'در صف'),
+        ('running', 'در حال اجرا'),
+        ('done', 'انجام شده'),
+        ('failed', 'ناموفق'),
+    )
+    
+    name = models.CharField(max_length=100, verbose_name='نوع کار')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='ورودی')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='وضعیت')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='تعداد تلاش')
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name='حداکثر تلاش')
+    last_error = models.TextField(blank=True, verbose_name='آخرین خطا')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='زمان اجرا')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name='تاریخ شروع')
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name='تاریخ پایان')
+    
+    class Meta:
+        verbose_name = 'کار پس‌زمینه'
+        verbose_name_plural = 'کارهای پس‌زمینه'
+        ordering = ['-created_at']
+        indexes = [
+            # صف کارهای آماده اجرا (worker)
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+    
+    def get_created_at_jalali(self):
+        if self.created_at:
+            jalali_datetime = jdatetime.datetime.fromgregorian(datetime=self.created_at)
+            return jalali_datetime.strftime('%Y/%m/%d - %H:%M')
+        return ''
+
+
+class MediaBlob(models.Model):
+    """
+    یک فایل ذخیره شده در ContentAddressedStorage و تعداد فیلدهایی که به آن
+    اشاره می‌کنند؛ با رسیدن تعداد ارجاع به صفر، فایل حذف می‌شود.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name='نام فایل')
+    ref_count = models.PositiveIntegerField(default=0, verbose_name='تعداد ارجاع')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    
+    class Meta:
+        verbose_name = 'فایل ذخیره شده'
+        verbose_name_plural = 'فایل‌های ذخیره شده'
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
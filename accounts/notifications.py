@@ -0,0 +1,107 @@
+"""
+اعلان‌های لحظه‌ای پیام‌ها از طریق Server-Sent Events.
+
+broker پیش‌فرض درون پروسه است و فقط وقتی کار می‌کند که تمام درخواست‌ها
+در یک پروسه ASGI اجرا شوند؛ برای چند پروسه می‌توان با تنظیم
+ACCOUNTS_NOTIFICATION_BROKER یک broker مشترک (مثلاً Redis pub/sub) با
+همین رابط subscribe/unsubscribe/publish جایگزین کرد.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """یک صف برای تب باز کاربر؛ باید از داخل event loop فراخوانی شود"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event):
+        """ارسال رویداد به همه تب‌های باز کاربر؛ از هر thread قابل فراخوانی است"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # event loop بسته شده است
+                pass
+
+    @staticmethod
+    def _put(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # تب کند است؛ رویدادهای بعدی وضعیت به‌روز را می‌رسانند
+            pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_path = getattr(
+                    settings, 'ACCOUNTS_NOTIFICATION_BROKER',
+                    'accounts.notifications.InProcessBroker'
+                )
+                _broker = import_string(broker_path)()
+    return _broker
+
+
+def publish_unread_counts(counts):
+    """counts: دیکشنری user_id -> تعداد پیام‌های خوانده نشده"""
+    broker = get_broker()
+    for user_id, count in counts.items():
+        broker.publish(user_id, {'event': 'unread', 'data': {'count': count}})
+
+
+def notify_new_messages(messages):
+    """ارسال خلاصه پیام‌های جدید ادمین بعد از commit شدن تراکنش"""
+    events = [
+        (message.user_id, {
+            'event': 'message',
+            'data': {
+                'id': message.pk,
+                'subject': message.subject,
+                'sender': 'ادمین سیستم',
+                'url': reverse('view_my_message_detail', args=[message.pk]),
+            },
+        })
+        for message in messages
+        if message.is_from_admin and message.pk
+    ]
+    if not events:
+        return
+
+    def publish():
+        broker = get_broker()
+        for user_id, event in events:
+            broker.publish(user_id, event)
+
+    transaction.on_commit(publish)
@@ -0,0 +1,138 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """یک صفحه از نتایج صفحه‌بندی مبتنی بر cursor"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class CursorPaginator:
+    """
+    صفحه‌بندی keyset روی فیلدهای ordering.
+
+    به جای OFFSET، هر صفحه از آخرین ردیف صفحه قبل ادامه پیدا می‌کند،
+    بنابراین هزینه هر صفحه مستقل از عمق آن است. آخرین فیلد ordering باید
+    یکتا باشد (معمولاً id) تا ترتیب پایدار بماند.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.descending = self.ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.model_fields = [queryset.model._meta.get_field(name) for name in self.fields]
+
+    def encode_cursor(self, obj):
+        values = [field.value_to_string(obj) for field in self.model_fields]
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(self.model_fields, values)]
+        except Exception:
+            raise InvalidCursor(cursor)
+
+    def _keyset_filter(self, values, forward):
+        # برای ordering نزولی، صفحه بعد مقادیر کوچکتر را می‌خواهد
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for index, name in enumerate(self.fields):
+            term = Q(**{f'{name}__{lookup}': values[index]})
+            for prev_name, prev_value in zip(self.fields[:index], values[:index]):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_page(self, after=None, before=None):
+        """
+        صفحه بعد از cursor ``after`` یا صفحه قبل از cursor ``before``.
+        cursor نامعتبر به صفحه اول برمی‌گردد.
+        """
+        try:
+            after_values = self.decode_cursor(after) if after else None
+            before_values = self.decode_cursor(before) if before else None
+        except InvalidCursor:
+            after_values = before_values = None
+
+        if before_values is not None:
+            queryset = self.queryset.filter(self._keyset_filter(before_values, forward=False))
+            rows = list(queryset.order_by(*self._reversed_ordering())[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            previous_cursor = self.encode_cursor(rows[0]) if has_more and rows else None
+            next_cursor = self.encode_cursor(rows[-1]) if rows else None
+            return CursorPage(rows, next_cursor=next_cursor, previous_cursor=previous_cursor)
+
+        queryset = self.queryset
+        if after_values is not None:
+            queryset = queryset.filter(self._keyset_filter(after_values, forward=True))
+        rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = self.encode_cursor(rows[-1]) if has_more else None
+        previous_cursor = self.encode_cursor(rows[0]) if after_values is not None and rows else None
+        return CursorPage(rows, next_cursor=next_cursor, previous_cursor=previous_cursor)
+
+    def get_page_containing(self, obj):
+        """
+        صفحه‌ای که obj اولین ردیف آن است؛ cursor از ردیف درست قبل از obj در همان
+        ordering ساخته می‌شود و بدون آن (obj اولین ردیف است) صفحه اول برمی‌گردد.
+        """
+        values = [field.value_from_object(obj) for field in self.model_fields]
+        previous = self.queryset.filter(
+            self._keyset_filter(values, forward=False)
+        ).order_by(*self._reversed_ordering()).first()
+        if previous is None:
+            return self.get_page()
+        return self.get_page(after=self.encode_cursor(previous))
+
+    def get_page_from_request(self, request, prefix=''):
+        return self.get_page(
+            after=request.GET.get(f'{prefix}after'),
+            before=request.GET.get(f'{prefix}before'),
+        )
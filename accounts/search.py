@@ -0,0 +1,166 @@
+"""
+جستجوی متنی روی پیام‌ها و جستجوی ایندکس‌شده کاربران.
+
+روی SQLite از جدول FTS5 با نام accounts_searchentry_fts و روی PostgreSQL
+از ایندکس GIN روی tsvector استفاده می‌شود؛ روی سایر دیتابیس‌ها جستجو به
+icontains برمی‌گردد. کاربران ایندکس جداگانه‌ای (accounts_customuser_fts)
+مستقیماً روی جدول کاربران دارند که با trigger به‌روز می‌شود.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import SearchEntry
+
+SEARCH_FTS_TABLE = 'accounts_searchentry_fts'
+SEARCH_TSVECTOR_SQL = "to_tsvector('simple', coalesce(e.subject, '') || ' ' || coalesce(e.body, ''))"
+# با triggerهای migration 0012 به‌روز می‌ماند؛ AlterField بعدی روی CustomUser در
+# SQLite جدول را از نو می‌سازد و باید triggerها را دوباره بسازد
+USER_FTS_TABLE = 'accounts_customuser_fts'
+USER_TSVECTOR_SQL = (
+    "to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '') "
+    "|| ' ' || coalesce(username, ''))"
+)
+MESSAGE_KINDS = ('contact', 'message')
+
+
+def contact_message_entry(contact_message):
+    return SearchEntry(
+        kind='contact',
+        object_id=contact_message.pk,
+        user_id=contact_message.user_id,
+        subject=contact_message.subject,
+        body='\n'.join(filter(None, [contact_message.message, contact_message.admin_response])),
+        created_at=contact_message.created_at,
+    )
+
+
+def user_message_entry(message):
+    return SearchEntry(
+        kind='message',
+        object_id=message.pk,
+        user_id=message.user_id,
+        subject=message.subject,
+        body=message.content,
+        created_at=message.created_at,
+    )
+
+
+def index_entry(entry):
+    SearchEntry.objects.update_or_create(
+        kind=entry.kind,
+        object_id=entry.object_id,
+        defaults={
+            'user_id': entry.user_id,
+            'subject': entry.subject,
+            'body': entry.body,
+            'created_at': entry.created_at,
+        }
+    )
+
+
+def index_entries(entries):
+    """ثبت گروهی اسناد جدید (مثلاً برای پیام‌های bulk_send)"""
+    SearchEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def remove_entry(kind, object_id):
+    SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def _fts_query(query):
+    # هر کلمه به صورت عبارت نقل‌قول شده و با تطبیق پیشوندی جستجو می‌شود
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_entries(query, kind=None, offset=0, limit=20):
+    """اسناد مرتبط با query به ترتیب امتیاز (bm25 / ts_rank)؛ kind می‌تواند یک نوع یا لیستی از انواع باشد"""
+    query = query.strip()
+    if not query:
+        return []
+
+    kind_params = [kind] if isinstance(kind, str) else list(kind or [])
+    kind_sql = f"AND e.kind IN ({', '.join(['%s'] * len(kind_params))})" if kind_params else ''
+
+    if connection.vendor == 'sqlite':
+        return list(SearchEntry.objects.raw(
+            f'SELECT e.* FROM accounts_searchentry e '
+            f'JOIN {SEARCH_FTS_TABLE} ON {SEARCH_FTS_TABLE}.rowid = e.id '
+            f'WHERE {SEARCH_FTS_TABLE} MATCH %s {kind_sql} '
+            f'ORDER BY bm25({SEARCH_FTS_TABLE}) LIMIT %s OFFSET %s',
+            [_fts_query(query), *kind_params, limit, offset]
+        ))
+
+    if connection.vendor == 'postgresql':
+        return list(SearchEntry.objects.raw(
+            f"SELECT e.* FROM accounts_searchentry e "
+            f"WHERE {SEARCH_TSVECTOR_SQL} @@ plainto_tsquery('simple', %s) {kind_sql} "
+            f"ORDER BY ts_rank({SEARCH_TSVECTOR_SQL}, plainto_tsquery('simple', %s)) DESC "
+            f"LIMIT %s OFFSET %s",
+            [query, *kind_params, query, limit, offset]
+        ))
+
+    entries = SearchEntry.objects.filter(body__icontains=query) | SearchEntry.objects.filter(subject__icontains=query)
+    if kind_params:
+        entries = entries.filter(kind__in=kind_params)
+    return list(entries.order_by('-created_at')[offset:offset + limit])
+
+
+def _prefix_filter(field, prefix):
+    # تطبیق پیشوندی به صورت بازه تا ایندکس B-tree استفاده شود؛
+    # startswith روی SQLite به LIKE تبدیل می‌شود که از ایندکس استفاده نمی‌کند
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+def filter_users(queryset, query):
+    """
+    جستجوی کاربران بر اساس شکل عبارت:
+
+    - ۱۰ رقم: کد ملی (تطبیق دقیق)
+    - ارقام با پیشوند 09: شماره موبایل (تطبیق پیشوندی)
+    - سایر ارقام: پیشوند کد ملی
+    - شامل @: پیشوند ایمیل
+    - در غیر این صورت: جستجوی متنی روی نام و نام کاربری
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+
+    if query.isdigit():
+        if len(query) == 10:
+            condition = Q(national_code=query)
+            if query.startswith('09'):
+                condition |= _prefix_filter('phone_number', query)
+            return queryset.filter(condition)
+        if query.startswith('09'):
+            return queryset.filter(_prefix_filter('phone_number', query))
+        return queryset.filter(_prefix_filter('national_code', query))
+
+    if '@' in query:
+        return queryset.filter(_prefix_filter('email', query))
+
+    return queryset.filter(_user_text_filter(query))
+
+
+def _user_text_filter(query):
+    # به جای لیست محدود شناسه‌ها، زیرکوئری روی ایندکس متنی کاربران برگردانده
+    # می‌شود تا همه نتایج (مثلاً در خروجی CSV) در دسترس باشند
+    if connection.vendor == 'sqlite':
+        return Q(pk__in=RawSQL(
+            f'SELECT rowid FROM {USER_FTS_TABLE} WHERE {USER_FTS_TABLE} MATCH %s',
+            [_fts_query(query)]
+        ))
+
+    if connection.vendor == 'postgresql':
+        return Q(pk__in=RawSQL(
+            f"SELECT id FROM accounts_customuser "
+            f"WHERE {USER_TSVECTOR_SQL} @@ plainto_tsquery('simple', %s)",
+            [query]
+        ))
+
+    condition = Q()
+    for term in query.split():
+        condition &= Q(first_name__icontains=term) | Q(last_name__icontains=term) | Q(username__icontains=term)
+    return condition
@@ -0,0 +1,45 @@
+"""
+فرستنده سیستمی پیام‌های ادمین.
+
+پیام‌های ادمینی که فرستنده ندارند از طرف این کاربر ثبت می‌شوند. با تنظیم
+ACCOUNTS_SYSTEM_SENDER (نام کاربری یک کاربر staff) می‌توان آن را مشخص کرد؛
+در غیر این صورت جدیدترین کاربر staff انتخاب می‌شود. شناسه آن در هر process
+یک بار خوانده می‌شود و با تغییر کاربران staff (سیگنال‌ها) یا پس از
+SYSTEM_SENDER_TTL ثانیه دوباره خوانده می‌شود تا processهای دیگر هم به‌روز شوند.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import CustomUser
+
+SYSTEM_SENDER_TTL = 300
+
+_lock = threading.Lock()
+_cached = None
+
+
+def get_system_sender_id():
+    global _cached
+    cached = _cached
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    with _lock:
+        staff = CustomUser.objects.filter(is_staff=True)
+        username = getattr(settings, 'ACCOUNTS_SYSTEM_SENDER', None)
+        if username:
+            staff = staff.filter(username=username)
+        sender_id = staff.values_list('pk', flat=True).first()
+        _cached = (sender_id, time.monotonic() + SYSTEM_SENDER_TTL)
+    return sender_id
+
+
+def is_system_sender(user_id):
+    cached = _cached
+    return cached is not None and cached[0] == user_id
+
+
+def invalidate_system_sender():
+    global _cached
+    _cached = None
@@ -1,6 +1,16 @@
-from django.db.models.signals import post_save
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import ContactMessage, UserMessage
+from .backends import invalidate_cached_users
+from .models import ContactMessage, Conversation, CustomUser, UserMessage
+from .counters import adjust_unread_count
+from .senders import invalidate_system_sender, is_system_sender
+from .storage import consume_pending_reference, content_storage, release_files, retain_files
+from .stats import invalidate_dashboard_stats
+from .user_actions import users_bulk_updated
+from .notifications import notify_new_messages
+from . import search
 
 @receiver(post_save, sender=ContactMessage)
 def create_user_message_on_admin_response(sender, instance, created, **kwargs):
@@ -22,6 +32,168 @@ def create_user_message_on_admin_response(sender, instance, created, **kwargs):
                 subject=f"پاسخ: {instance.subject}",
                 content=instance.admin_response,
                 sender=None,  # ادمین سیستم
-                receiver=instance.user,
                 is_read=False
-            )
\ No newline at end of file
+            )
+
+
+@receiver(post_save, sender=UserMessage)
+def update_unread_count_on_save(sender, instance, created, raw=False, **kwargs):
+    """به‌روزرسانی شمارنده پیام‌های خوانده نشده هنگام ایجاد یا خواندن پیام"""
+    if raw:
+        return
+    was_unread = getattr(instance, '_counted_as_unread', False)
+    is_unread = instance.counts_as_unread
+    if was_unread != is_unread:
+        adjust_unread_count([instance.user_id], 1 if is_unread else -1)
+    instance._counted_as_unread = is_unread
+
+
+@receiver(post_delete, sender=UserMessage)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    if getattr(instance, '_counted_as_unread', False):
+        adjust_unread_count([instance.user_id], -1)
+
+
+@receiver(post_save, sender=UserMessage)
+def update_conversation_on_new_message(sender, instance, created, raw=False, **kwargs):
+    """به‌روزرسانی تعداد پیام‌ها، زمان آخرین پیام و شرکت‌کنندگان گفتگو"""
+    if raw or not created or not instance.conversation_id:
+        return
+    Conversation.objects.filter(pk=instance.conversation_id).update(
+        message_count=F('message_count') + 1,
+        last_message_at=Greatest(
+            Coalesce(F('last_message_at'), Value(instance.created_at)),
+            Value(instance.created_at)
+        )
+    )
+    Participant = Conversation.participants.through
+    Participant.objects.bulk_create([
+        Participant(conversation_id=instance.conversation_id, customuser_id=user_id)
+        for user_id in {instance.user_id, instance.sender_id} - {None}
+    ], ignore_conflicts=True)
+
+
+@receiver(post_delete, sender=UserMessage)
+def update_conversation_on_delete(sender, instance, **kwargs):
+    if instance.conversation_id:
+        Conversation.objects.filter(
+            pk=instance.conversation_id,
+            message_count__gt=0
+        ).update(message_count=F('message_count') - 1)
+
+
+@receiver(post_save, sender=UserMessage)
+def notify_user_on_new_message(sender, instance, created, raw=False, **kwargs):
+    """اعلان لحظه‌ای پیام جدید ادمین به تب‌های باز کاربر"""
+    if created and not raw:
+        notify_new_messages([instance])
+
+
+@receiver(post_save, sender=ContactMessage)
+def index_contact_message(sender, instance, raw=False, **kwargs):
+    """همگام نگه داشتن ایندکس جستجوی متنی"""
+    if not raw:
+        search.index_entry(search.contact_message_entry(instance))
+
+
+@receiver(post_save, sender=UserMessage)
+def index_user_message(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields and not {'subject', 'content'} & set(update_fields):
+        return
+    if created:
+        search.index_entries([search.user_message_entry(instance)])
+    else:
+        search.index_entry(search.user_message_entry(instance))
+
+
+@receiver(post_delete, sender=ContactMessage)
+def remove_contact_message_from_index(sender, instance, **kwargs):
+    search.remove_entry('contact', instance.pk)
+
+
+@receiver(post_delete, sender=UserMessage)
+def remove_user_message_from_index(sender, instance, **kwargs):
+    search.remove_entry('message', instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_save, sender=ContactMessage)
+@receiver(post_delete, sender=ContactMessage)
+@receiver(post_save, sender=UserMessage)
+@receiver(post_delete, sender=UserMessage)
+def invalidate_dashboard_stats_on_change(sender, raw=False, **kwargs):
+    """پاک کردن snapshot آمار داشبورد هنگام تغییر کاربران یا پیام‌ها"""
+    if not raw:
+        invalidate_dashboard_stats()
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_system_sender_on_staff_change(sender, instance, update_fields=None, **kwargs):
+    """با تغییر کاربران staff، فرستنده سیستمی دوباره خوانده می‌شود"""
+    if update_fields and not {'is_staff', 'username'} & set(update_fields):
+        return
+    if instance.is_staff or is_system_sender(instance.pk):
+        invalidate_system_sender()
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_auth_user(sender, instance, raw=False, **kwargs):
+    """پاک کردن کاربر cache شده backend احراز هویت"""
+    if not raw:
+        invalidate_cached_users([instance.pk])
+
+
+@receiver(users_bulk_updated)
+def invalidate_caches_on_bulk_user_update(sender, user_ids, fields, **kwargs):
+    """تغییرات گروهی با update() سیگنال post_save ندارند؛ cacheهای وابسته اینجا پاک می‌شوند"""
+    invalidate_dashboard_stats()
+    invalidate_cached_users(user_ids)
+
+
+# فیلدهای فایل CustomUser که در ContentAddressedStorage ذخیره می‌شوند
+STORED_FILE_FIELDS = ('profile_image', 'job_document')
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_stored_files(sender, instance, raw=False, update_fields=None, **kwargs):
+    """نام فایل‌های فعلی کاربر در پایگاه داده، برای به‌روزرسانی تعداد ارجاع در post_save"""
+    instance._stored_files = None
+    if raw or (update_fields is not None and not set(STORED_FILE_FIELDS) & set(update_fields)):
+        return
+    if instance._state.adding:
+        instance._stored_files = {}
+    else:
+        instance._stored_files = CustomUser.objects.filter(pk=instance.pk).values(*STORED_FILE_FIELDS).first() or {}
+
+
+@receiver(post_save, sender=CustomUser)
+def update_stored_file_references(sender, instance, update_fields=None, **kwargs):
+    previous = getattr(instance, '_stored_files', None)
+    if previous is None:
+        return
+    instance._stored_files = None
+    retained, released = [], []
+    for field in STORED_FILE_FIELDS:
+        if update_fields is not None and field not in update_fields:
+            continue
+        name = getattr(instance, field).name or ''
+        previous_name = previous.get(field) or ''
+        if name != previous_name:
+            if not consume_pending_reference(instance, name):
+                retained.append(name)
+            released.append(previous_name)
+        elif consume_pending_reference(instance, name):
+            # همان فایل دوباره آپلود شده؛ ارجاع اضافه‌ای که هنگام ذخیره ثبت شد برگردانده می‌شود
+            released.append(name)
+    retain_files(content_storage, retained)
+    release_files(content_storage, released)
+
+
+@receiver(post_delete, sender=CustomUser)
+def release_stored_files(sender, instance, **kwargs):
+    release_files(content_storage, [getattr(instance, field).name for field in STORED_FILE_FIELDS])
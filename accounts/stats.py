@@ -0,0 +1,45 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import CustomUser, ContactMessage, UserMessage
+
+DASHBOARD_STATS_CACHE_KEY = 'accounts:dashboard_stats'
+DASHBOARD_STATS_TTL = 60
+
+
+def compute_dashboard_stats():
+    """آمار کاربران با یک کوئری conditional aggregation و تعداد پیام‌های در انتظار"""
+    stats = CustomUser.objects.aggregate(
+        total=Count('id'),
+        normal=Count('id', filter=Q(user_type='normal')),
+        worker=Count('id', filter=Q(user_type='worker')),
+        employee=Count('id', filter=Q(user_type='employee')),
+        staff=Count('id', filter=Q(is_staff=True)),
+    )
+    return {
+        'user_stats': stats,
+        'pending_contact_count': ContactMessage.objects.filter(status='pending').count(),
+        'pending_private_count': UserMessage.objects.filter(
+            is_from_admin=False,
+            message_type='private',
+            is_read=False
+        ).count(),
+    }
+
+
+def get_dashboard_stats():
+    """
+    snapshot آمار داشبورد از cache؛ با TTL کوتاه و پاک شدن هنگام تغییر
+    کاربران یا پیام‌ها، هزینه صفحه مستقل از تعداد کاربران می‌ماند.
+    """
+    stats = cache.get(DASHBOARD_STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_STATS_CACHE_KEY, stats, DASHBOARD_STATS_TTL)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    # بعد از commit پاک می‌شود تا درخواست همزمان مقدار قدیمی را دوباره cache نکند
+    transaction.on_commit(lambda: cache.delete(DASHBOARD_STATS_CACHE_KEY))
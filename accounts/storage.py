@@ -0,0 +1,139 @@
+"""
+ذخیره فایل‌های آپلود شده بر اساس hash محتوا.
+
+هر فایل با نام <پوشه>/<hash[:2]>/<hash[2:4]>/<hash><پسوند> ذخیره می‌شود، پس
+فایل‌های تکراری (عکس پروفایل پیش‌فرض، نامه‌های یکسان کارفرما و ...) فقط یک بار
+روی دیسک نوشته می‌شوند: اگر فایلی با همان hash وجود داشته باشد، چیزی نوشته نمی‌شود.
+hash در زمان آپلود توسط accounts.uploadhandlers محاسبه می‌شود.
+
+تعداد ارجاع هر فایل در MediaBlob نگه داشته می‌شود: ذخیره فایل یک ارجاع ثبت
+می‌کند که روی همان instance مدل (_pending_blob_refs) می‌ماند تا post_save آن را
+مصرف کند و سیگنال‌های CustomUser ارجاع فایل‌های قبلی را کم می‌کنند؛ فایلی که
+دیگر ارجاعی ندارد بعد از commit حذف می‌شود.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile, ImageFieldFile
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def content_hash(content):
+    digest = getattr(content, 'content_hash', None)
+    if digest:
+        return digest
+    # فایل‌هایی که از upload handler عبور نکرده‌اند (ContentFile و ...)
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+@deconstructible(path='accounts.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        digest = content_hash(content)
+        directory = posixpath.dirname(name.replace(os.sep, '/'))
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+        # ارجاع قبل از بررسی وجود فایل ثبت می‌شود تا delete_unreferenced نتواند
+        # فایل را بین این لحظه و post_save مدل حذف کند
+        retain_files(self, [name])
+        if self.exists(name):
+            # فایل تکراری: بدون نوشتن روی دیسک
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def is_content_addressed(self, name):
+        return bool(name) and bool(CONTENT_NAME_RE.search(name))
+
+
+content_storage = ContentAddressedStorage()
+
+
+class PendingReferenceMixin:
+    """
+    ارجاعی که ContentAddressedStorage.save ثبت کرده روی instance همین فایل
+    نگه داشته می‌شود؛ اگر ذخیره مدل شکست بخورد، ارجاع به ذخیره مدل دیگری نمی‌رسد.
+    """
+
+    def save(self, name, content, save=True):
+        super().save(name, content, save=False)
+        self.instance.__dict__.setdefault('_pending_blob_refs', []).append(self.name)
+        if save:
+            self.instance.save()
+
+    save.alters_data = True
+
+
+class ContentFieldFile(PendingReferenceMixin, FieldFile):
+    pass
+
+
+class ContentImageFieldFile(PendingReferenceMixin, ImageFieldFile):
+    pass
+
+
+class ContentFileField(models.FileField):
+    attr_class = ContentFieldFile
+
+
+class ContentImageField(models.ImageField):
+    attr_class = ContentImageFieldFile
+
+
+def consume_pending_reference(instance, name):
+    """ارجاعی که هنگام ذخیره فایل این instance ثبت شده؛ True یعنی post_save نباید دوباره ارجاع را افزایش دهد"""
+    references = instance.__dict__.get('_pending_blob_refs')
+    if references and name in references:
+        references.remove(name)
+        return True
+    return False
+
+
+def retain_files(storage, names):
+    """افزایش تعداد ارجاع فایل‌ها (در صورت حذف همزمان ردیف، دوباره ساخته می‌شود)"""
+    from .models import MediaBlob
+    for name in names:
+        if not storage.is_content_addressed(name):
+            continue
+        with transaction.atomic():
+            while not MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+                try:
+                    with transaction.atomic():
+                        MediaBlob.objects.create(name=name, ref_count=1)
+                    break
+                except IntegrityError:
+                    # ردیف همزمان ساخته شد؛ دوباره افزایش داده می‌شود
+                    continue
+
+
+def release_files(storage, names):
+    """کاهش تعداد ارجاع فایل‌ها و حذف فایل‌هایی که دیگر ارجاعی ندارند (بعد از commit)"""
+    from .models import MediaBlob
+    for name in names:
+        if not storage.is_content_addressed(name):
+            continue
+        MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        if MediaBlob.objects.filter(name=name, ref_count=0).exists():
+            transaction.on_commit(lambda name=name: delete_unreferenced(storage, name))
+
+
+def delete_unreferenced(storage, name):
+    from .models import MediaBlob
+    # حذف ردیف و فایل در یک تراکنش: retain_files همزمان روی همین ردیف منتظر می‌ماند
+    # و پس از آن ردیف را دوباره می‌سازد و فایل را دوباره می‌نویسد
+    with transaction.atomic():
+        deleted, _ = MediaBlob.objects.filter(name=name, ref_count=0).delete()
+        if deleted:
+            storage.delete(name)
@@ -0,0 +1,21 @@
+"""handlerهای کارهای پس‌زمینه (accounts.jobs)"""
+from .broadcast import run_broadcast
+from .jobs import register_job
+from .models import CustomUser
+from .thumbnails import generate_profile_thumbnails
+
+
+@register_job('profile_thumbnails', cpu_bound=True)
+def profile_thumbnails(user_id):
+    user = CustomUser.objects.filter(pk=user_id).only('profile_image').first()
+    if user is None:
+        # کاربر قبل از اجرای کار حذف شده است
+        return 0
+    return generate_profile_thumbnails(user)
+
+
+# ارسال گروهی به همه کاربران ممکن است طولانی باشد؛ اجرای دوباره از آخرین
+# گیرنده ادامه می‌دهد
+@register_job('broadcast', stale_after=3600)
+def broadcast(broadcast_id):
+    return run_broadcast(broadcast_id)
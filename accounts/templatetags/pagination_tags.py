@@ -0,0 +1,17 @@
+from django import template
+
+register = template.Library()
+
+@register.simple_tag(takes_context=True)
+def cursor_query(context, prefix='', **cursors):
+    """
+    query string صفحه دیگری از یک لیست cursor (prefix مثل 'contact_')؛ cursor
+    لیست‌های دیگر صفحه و فیلترها (جستجو و ...) حفظ می‌شوند.
+    """
+    query = context['request'].GET.copy()
+    for name in ('after', 'before'):
+        query.pop(f'{prefix}{name}', None)
+    for name, value in cursors.items():
+        if value:
+            query[f'{prefix}{name}'] = value
+    return f'?{query.urlencode()}'
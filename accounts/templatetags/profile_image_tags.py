@@ -0,0 +1,14 @@
+from django import template
+
+register = template.Library()
+
+@register.filter
+def profile_image_url(user, size):
+    """آدرس تصویر کوچک JPEG عکس پروفایل در اندازه size"""
+    return user.get_profile_image_url(int(size))
+
+
+@register.filter
+def profile_image_srcset(user, image_format='jpeg'):
+    """srcset تصاویر کوچک عکس پروفایل ('webp' یا 'jpeg')"""
+    return user.get_profile_image_srcset(image_format)
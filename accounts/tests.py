@@ -1,3 +1,1470 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from PIL import Image
+
+from . import broadcast as broadcasts
+from .age_groups import age_group_for, local_today, years_ago
+from .backends import auth_user_cache_key
+from .context_processors import user_info
+from .counters import UNREAD_COUNT_CACHE_TTL, get_unread_count
+from .files import file_validators, parse_range, send_file
+from .forms import AdminToUserMessageForm, LoginForm
+from .jobs import (
+    JOB_HANDLERS, JOB_RETRY_DELAY, JOB_STALE_AFTER, claim_jobs, enqueue, execute_job, finish_job, format_error,
+    release_stale_jobs,
+)
+from .models import Broadcast, CustomUser, ContactMessage, Job, MediaBlob, UserMessage
+from .search import filter_users, search_entries
+from .pagination import CursorPaginator
+from .senders import SYSTEM_SENDER_TTL, get_system_sender_id, invalidate_system_sender
+from .stats import compute_dashboard_stats, get_dashboard_stats
+from .storage import content_storage
+from .thumbnails import (
+    PROFILE_THUMBNAIL_SIZES, THUMBNAIL_FORMATS, generate_profile_thumbnails, get_thumbnail, render_thumbnails,
+)
+from .views import AUTOCOMPLETE_LIMIT, SEARCH_RESULTS_PER_PAGE
+
+# «SCAN table» بدون ایندکس پیمایش کامل جدول است؛ پیمایش ایندکس هم وقتی
+# ترتیب آن استفاده نشود (USE TEMP B-TREE) تا انتها خوانده می‌شود
+FULL_SCAN_RE = re.compile(r'\bSCAN \w+$')
+INDEX_SCAN_RE = re.compile(r'\bSCAN \w+ USING (COVERING )?INDEX')
+
+
+def make_admin(**fields):
+    """ادمین آزمایشی مشترک بین کلاس‌های تست"""
+    fields = {'username': 'admin', 'national_code': '1000000001', 'is_staff': True, **fields}
+    return CustomUser.objects.create_user(password='password', **fields)
+
+
+def make_user(**fields):
+    """یک کاربر عادی آزمایشی؛ فیلدهای دلخواه جایگزین پیش‌فرض‌ها می‌شوند"""
+    fields = {'username': 'user', 'national_code': '1000000002', **fields}
+    return CustomUser.objects.create_user(password='password', **fields)
+
+
+def make_users(count, prefix='member', **fields):
+    """count کاربر با نام کاربری و کد ملی یکتا"""
+    return [
+        CustomUser.objects.create_user(
+            username=f'{prefix}{i}', password='password', national_code=f'{2000000000 + i}', **fields
+        )
+        for i in range(count)
+    ]
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN فقط روی SQLite بررسی می‌شود')
+class QueryPlanTests(TestCase):
+    """کوئری‌های پشت صفحات اصلی نباید به پیمایش کامل جدول برگردند"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user(
+            first_name='علی',
+            last_name='رضایی',
+            email='user@example.com',
+            phone_number='09120000002'
+        )
+        contact_message = ContactMessage.objects.create(user=cls.user, subject='بلیت', message='خرید بلیت')
+        UserMessage.objects.create(
+            user=cls.user,
+            contact_message=contact_message,
+            is_from_admin=False,
+            message_type='contact',
+            subject='بلیت',
+            content='خرید بلیت',
+            sender=cls.user,
+            is_read=True
+        )
+        cls.message = UserMessage.objects.create(
+            user=cls.user,
+            is_from_admin=True,
+            message_type='private',
+            subject='اطلاعیه',
+            content='استخر فردا تعطیل است',
+            sender=cls.admin
+        )
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[-1] for row in cursor.fetchall()]
+        sorted_in_memory = any('USE TEMP B-TREE' in detail for detail in details)
+        return [
+            detail for detail in details
+            if FULL_SCAN_RE.search(detail) or (sorted_in_memory and INDEX_SCAN_RE.search(detail))
+        ]
+
+    def assertNoFullScan(self, user, url, data=None):
+        self.client.force_login(user)
+        # آمار داشبورد عمداً روی کل جدول کاربران aggregate می‌شود و cache است
+        get_dashboard_stats()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            with self.subTest(url=url, data=data, sql=sql):
+                self.assertEqual(self.full_scans(sql), [])
+
+    def test_dashboard_stats(self):
+        with CaptureQueriesContext(connection) as context:
+            compute_dashboard_stats()
+        # اولین کوئری aggregate روی کل کاربران است و نتیجه‌اش cache می‌شود
+        for query in context.captured_queries[1:]:
+            with self.subTest(sql=query['sql']):
+                self.assertEqual(self.full_scans(query['sql']), [])
+
+    def test_dashboard(self):
+        self.assertNoFullScan(self.admin, reverse('dashboard'))
+
+    def test_dashboard_next_page(self):
+        contact_cursor = CursorPaginator(ContactMessage.objects.all(), 10).encode_cursor(ContactMessage.objects.get())
+        self.assertNoFullScan(self.admin, reverse('dashboard'), {'contact_after': contact_cursor})
+
+    def test_user_management(self):
+        self.assertNoFullScan(self.admin, reverse('user_management'))
+        self.assertNoFullScan(self.admin, reverse('user_management'), {'user_type': 'worker'})
+
+    def test_user_management_search(self):
+        for query in ['1000000002', '0912', '10000', 'user@ex', 'رضا']:
+            self.assertNoFullScan(self.admin, reverse('user_management'), {'search': query})
+
+    def test_user_autocomplete(self):
+        self.assertNoFullScan(self.admin, reverse('user_autocomplete'), {'q': 'علی'})
+
+    def test_user_detail(self):
+        self.assertNoFullScan(self.admin, reverse('user_detail', args=[self.user.id]))
+
+    def test_send_message(self):
+        self.assertNoFullScan(self.admin, reverse('send_message_to_user', args=[self.user.id]))
+
+    def test_message_search(self):
+        self.assertNoFullScan(self.admin, reverse('message_search'), {'q': 'استخر'})
+
+    def test_my_messages(self):
+        self.assertNoFullScan(self.user, reverse('my_messages'))
+
+    def test_message_detail(self):
+        self.assertNoFullScan(self.user, reverse('view_my_message_detail', args=[self.message.id]))
+
+
+class OriginalMessageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user()
+
+    def contact(self, subject):
+        """پیام تماس با پیام اصلی کاربر، پاسخ ادمین و پیگیری دوم کاربر"""
+        contact_message = ContactMessage.objects.create(user=self.user, subject=subject, message='متن')
+        fields = {'user': self.user, 'contact_message': contact_message, 'message_type': 'contact', 'subject': subject}
+        original = UserMessage.objects.create(is_from_admin=False, content='اولین', sender=self.user, **fields)
+        reply = UserMessage.objects.create(is_from_admin=True, content='پاسخ', sender=self.admin, **fields)
+        UserMessage.objects.create(is_from_admin=False, content='پیگیری', sender=self.user, **fields)
+        return contact_message, original, reply
+
+    def test_annotation_points_to_first_user_message(self):
+        expected = {}
+        for i in range(3):
+            contact_message, original, reply = self.contact(f'تماس {i}')
+            expected[contact_message.pk] = original.pk
+        ContactMessage.objects.create(user=self.user, subject='بدون پیام', message='متن')
+        with self.assertNumQueries(1):
+            annotated = {
+                message.pk: message.original_message_id for message in ContactMessage.objects.with_original_message()
+            }
+        self.assertEqual({pk: value for pk, value in annotated.items() if value}, expected)
+        self.assertEqual(len(annotated), 4)
+        reply = UserMessage.objects.with_original_message().get(pk=reply.pk)
+        self.assertEqual(reply.original_message_id, original.pk)
+
+    def test_my_messages_query_count_does_not_grow(self):
+        self.client.force_login(self.user)
+        self.contact('تماس')
+        with CaptureQueriesContext(connection) as one_contact:
+            self.client.get(reverse('my_messages'))
+        for i in range(5):
+            self.contact(f'تماس {i}')
+        with CaptureQueriesContext(connection) as six_contacts:
+            response = self.client.get(reverse('my_messages'))
+        self.assertEqual(len(six_contacts), len(one_contact))
+        self.assertTrue(all(message.original_message_id for message in response.context['contact_messages']))
+
+
+class UserInfoContextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user()
+        cls.messages = [
+            UserMessage.objects.create(
+                user=cls.user, is_from_admin=True, message_type='private', subject=f'پیام {i}',
+                content='متن', sender=cls.admin
+            )
+            for i in range(7)
+        ]
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return request
+
+    def test_values_are_lazy_and_computed_once(self):
+        request = self.request()
+        with self.assertNumQueries(0):
+            context = user_info(request)
+        with self.assertNumQueries(2):
+            self.assertEqual(context['user_total_messages'] + 0, 7)
+            self.assertEqual(
+                [message.pk for message in context['user_recent_messages']],
+                [message.pk for message in self.messages[:-6:-1]]
+            )
+        # خواندن دوباره و context processor دوم همان درخواست کوئری جدیدی ندارند
+        with self.assertNumQueries(0):
+            self.assertEqual(user_info(request)['user_total_messages'] + 0, 7)
+            self.assertEqual(len(context['user_recent_messages']), 5)
+
+    def test_pages_that_do_not_use_them_run_no_message_queries(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('about'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in context.captured_queries if 'accounts_usermessage' in query['sql']])
+
+    def test_anonymous(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            self.assertEqual(user_info(request)['user_total_messages'], 0)
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+
+    def setUp(self):
+        # شمارنده cache شده کاربر هم‌شناسه در تست‌های دیگر نباید اینجا خوانده شود
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_poll_returns_changed_count(self):
+        response = self.client.get(reverse('notifications_poll'), {'count': 3})
+        self.assertEqual(response.json(), {'count': 0, 'changed': True})
+
+    def test_poll_answers_immediately_when_unchanged(self):
+        with mock.patch('time.sleep') as sleep:
+            response = self.client.get(reverse('notifications_poll'), {'count': 0})
+        self.assertEqual(response.json(), {'count': 0, 'changed': False})
+        sleep.assert_not_called()
+
+    @override_settings(ACCOUNTS_NOTIFICATION_POLL_INTERVAL=45)
+    def test_poll_script_uses_timer(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'const pollInterval = 45 * 1000;')
+
+    def test_stream_only_under_asgi_setting(self):
+        self.assertEqual(self.client.get(reverse('notifications_stream')).status_code, 404)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, reverse('notifications_poll'))
+        self.assertNotContains(response, 'EventSource(')
+
+    @override_settings(ACCOUNTS_NOTIFICATION_STREAM=True)
+    def test_stream_script_when_enabled(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'EventSource(')
+        self.assertNotContains(response, reverse('notifications_poll'))
+
+
+@mock.patch('captcha.conf.settings.CAPTCHA_TEST_MODE', True)
+@override_settings(ACCOUNTS_PASSWORD_ITERATIONS=1000)
+class AsyncAuthViewTests(TestCase):
+    CAPTCHA = {'captcha_0': 'test', 'captcha_1': 'PASSED'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+
+    async def logged_in_user_id(self):
+        session = await self.async_client.asession()
+        return await session.aget(SESSION_KEY)
+
+    async def test_login(self):
+        response = await self.async_client.post(
+            reverse('login'), {'username': 'user', 'password': 'password', **self.CAPTCHA}
+        )
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(await self.logged_in_user_id(), str(self.user.pk))
+
+    async def test_failed_login_rerenders_form(self):
+        response = await self.async_client.post(
+            reverse('login'), {'username': 'user', 'password': 'wrong', **self.CAPTCHA}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'accounts/login.html')
+        self.assertEqual(response.context['form'].non_field_errors(), [LoginForm.error_message])
+        self.assertIsNone(await self.logged_in_user_id())
+
+    async def test_register(self):
+        response = await self.async_client.post(reverse('register'), {
+            'username': 'newcomer', 'email': 'newcomer@example.com',
+            'password1': 'Zx!long-pass-91', 'password2': 'Zx!long-pass-91',
+            'first_name': 'سارا', 'last_name': 'احمدی', 'national_code': '1000000003',
+            'phone_number': '09120000003', **self.CAPTCHA,
+        })
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        user = await CustomUser.objects.aget(username='newcomer')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(await user.acheck_password('Zx!long-pass-91'))
+        self.assertEqual(await self.logged_in_user_id(), str(user.pk))
+
+    async def test_login_rehashes_legacy_password(self):
+        legacy = make_password('password', hasher='pbkdf2_sha1')
+        await CustomUser.objects.filter(pk=self.user.pk).aupdate(password=legacy)
+        response = await self.async_client.post(
+            reverse('login'), {'username': 'user', 'password': 'password', **self.CAPTCHA}
+        )
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        user = await CustomUser.objects.aget(pk=self.user.pk)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(await user.acheck_password('password'))
+
+
+class CachedUserTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user(phone_number='09120000002')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_repeat_request_uses_cached_user(self):
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('home'))
+        auth_queries = [
+            query['sql'] for query in context.captured_queries
+            if 'accounts_customuser' in query['sql'] or 'django_session' in query['sql']
+        ]
+        self.assertEqual(auth_queries, [])
+
+    def test_unread_count_change_invalidates_cached_user(self):
+        self.client.get(reverse('profile'))
+        self.assertIsNotNone(cache.get(auth_user_cache_key(self.user.pk)))
+        with self.captureOnCommitCallbacks(execute=True):
+            UserMessage.objects.create(
+                user=self.user, is_from_admin=True, message_type='private',
+                subject='اطلاعیه', content='متن', sender=self.admin
+            )
+        self.assertIsNone(cache.get(auth_user_cache_key(self.user.pk)))
+
+    def test_profile_update_keeps_unread_count(self):
+        self.client.get(reverse('profile'))
+        # شمارنده با UPDATE تغییر می‌کند و نمونه cache شده قدیمی می‌ماند
+        CustomUser.objects.filter(pk=self.user.pk).update(unread_messages_count=1)
+        response = self.client.post(reverse('profile'), {
+            'first_name': 'علی',
+            'last_name': 'رضایی',
+            'phone_number': '09120000002',
+        })
+        self.assertEqual(response.status_code, 302)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        self.assertEqual(user.first_name, 'علی')
+        self.assertEqual(user.unread_messages_count, 1)
+
+
+class SystemSenderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user()
+
+    def setUp(self):
+        invalidate_system_sender()
+        self.addCleanup(invalidate_system_sender)
+
+    def test_cached_sender_is_reused(self):
+        self.assertEqual(get_system_sender_id(), self.admin.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_system_sender_id(), self.admin.pk)
+        # ذخیره کاربر عادی فرستنده را دوباره نمی‌خواند
+        self.user.first_name = 'علی'
+        self.user.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_system_sender_id(), self.admin.pk)
+        message = UserMessage.objects.create(
+            user=self.user, is_from_admin=True, message_type='private', subject='اطلاعیه', content='متن'
+        )
+        self.assertEqual(message.sender_id, self.admin.pk)
+
+    def test_refreshed_after_sender_changes(self):
+        self.assertEqual(get_system_sender_id(), self.admin.pk)
+        other = make_admin(username='admin2', national_code='1000000009')
+        self.assertEqual(get_system_sender_id(), other.pk)
+        other.is_staff = False
+        other.save(update_fields=['is_staff'])
+        self.assertEqual(get_system_sender_id(), self.admin.pk)
+        self.admin.delete()
+        self.assertIsNone(get_system_sender_id())
+
+    @override_settings(ACCOUNTS_SYSTEM_SENDER='admin')
+    def test_refreshed_after_ttl(self):
+        self.assertEqual(get_system_sender_id(), self.admin.pk)
+        # تغییری که سیگنال آن در process دیگری اجرا شده است
+        CustomUser.objects.filter(pk=self.admin.pk).update(username='former-admin')
+        self.assertEqual(get_system_sender_id(), self.admin.pk)
+        with mock.patch('time.monotonic', return_value=time.monotonic() + SYSTEM_SENDER_TTL + 1):
+            self.assertIsNone(get_system_sender_id())
+
+
+class UserAutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin(first_name='سارا')
+        cls.users = make_users(AUTOCOMPLETE_LIMIT + 2, first_name='سارا', last_name='محمدی')
+        cls.other = make_user(first_name='مریم', last_name='سارایی')
+
+    def autocomplete(self, query):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('user_autocomplete'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_results_are_limited_and_exclude_staff(self):
+        results = self.autocomplete('سارا')
+        self.assertEqual(len(results), AUTOCOMPLETE_LIMIT)
+        self.assertNotIn(self.admin.pk, [result['id'] for result in results])
+        # جدیدترین کاربران اول می‌آیند
+        self.assertEqual(results[0], {
+            'id': self.other.pk, 'name': 'مریم سارایی', 'email': '', 'national_code': '1000000002',
+        })
+
+    def test_prefix_matching(self):
+        self.assertEqual([result['id'] for result in self.autocomplete('مری')], [self.other.pk])
+        self.assertEqual(self.autocomplete('ریم'), [])
+        self.assertEqual([result['id'] for result in self.autocomplete('2000000001')], [self.users[1].pk])
+        self.assertEqual(self.autocomplete('م'), [])
+
+    def test_requires_admin(self):
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('user_autocomplete'), {'q': 'سارا'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_message_form_validates_only_the_submitted_user(self):
+        data = {'subject': 'سلام', 'content': 'متن', 'message_type': 'private'}
+        form = AdminToUserMessageForm({**data, 'user': self.other.pk})
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(form.is_valid())
+        # فقط همان کاربر ارسال شده خوانده می‌شود، نه لیست همه کاربران
+        for query in context.captured_queries:
+            self.assertIn(f'"accounts_customuser"."id" = {self.other.pk}', query['sql'])
+            self.assertTrue(query['sql'].endswith('LIMIT 1'))
+        self.assertEqual(form.cleaned_data['user'], self.other)
+        for user_id in (self.admin.pk, 0):
+            with self.subTest(user_id=user_id):
+                form = AdminToUserMessageForm({**data, 'user': user_id})
+                self.assertFalse(form.is_valid())
+                self.assertIn('user', form.errors)
+
+
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user()
+        make_users(2, prefix='worker', user_type='worker')
+        make_user(username='employee', national_code='1000000003', user_type='employee')
+        ContactMessage.objects.create(user=cls.user, subject='بلیت', message='متن')
+        replied = ContactMessage.objects.create(user=cls.user, subject='سانس', message='متن')
+        ContactMessage.objects.filter(pk=replied.pk).update(status='replied')
+        for is_read in (False, False, True):
+            UserMessage.objects.create(
+                user=cls.user, message_type='private', subject='سوال', content='متن', is_read=is_read
+            )
+        UserMessage.objects.create(
+            user=cls.user, is_from_admin=True, message_type='private', subject='پاسخ', content='متن',
+            sender=cls.admin
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_compute(self):
+        self.assertEqual(compute_dashboard_stats(), {
+            'user_stats': {'total': 5, 'normal': 2, 'worker': 2, 'employee': 1, 'staff': 1},
+            'pending_contact_count': 1,
+            'pending_private_count': 2,
+        })
+
+    def test_snapshot_is_cached(self):
+        stats = get_dashboard_stats()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats(), stats)
+        # بدون سیگنال (مثلاً update) مقدار cache شده تا پایان TTL باقی می‌ماند
+        CustomUser.objects.filter(pk=self.user.pk).update(user_type='worker')
+        self.assertEqual(get_dashboard_stats()['user_stats']['worker'], 2)
+
+    def test_changes_invalidate_snapshot(self):
+        changes = {
+            'user': lambda: make_user(username='new', national_code='1000000004'),
+            'contact': lambda: ContactMessage.objects.create(user=self.user, subject='جدید', message='متن'),
+            'message': lambda: UserMessage.objects.create(
+                user=self.user, message_type='private', subject='جدید', content='متن'
+            ),
+            'delete': lambda: ContactMessage.objects.filter(status='pending').first().delete(),
+        }
+        for name, change in changes.items():
+            with self.subTest(change=name):
+                stats = get_dashboard_stats()
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                self.assertNotEqual(get_dashboard_stats(), stats)
+
+    def test_dashboard_uses_snapshot(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['user_stats']['worker'], 2)
+        self.assertEqual(response.context['pending_private_count'], 2)
+
+
+class UserSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'member{i}', first_name='رضا', last_name=f'کریمی{i}',
+                national_code=f'{3000000000 + i}', password='!'
+            )
+            for i in range(1100)
+        ])
+
+    def test_name_search_is_not_capped(self):
+        users = filter_users(CustomUser.objects.all(), 'کریم')
+        self.assertEqual(users.count(), 1100)
+
+    def test_index_follows_user_changes(self):
+        user = CustomUser.objects.get(username='member7')
+        user.last_name = 'احمدی'
+        user.save()
+        users = CustomUser.objects.all()
+        self.assertEqual(list(filter_users(users, 'احمد')), [user])
+        self.assertFalse(filter_users(users, 'کریمی7').filter(pk=user.pk).exists())
+        user.delete()
+        self.assertFalse(filter_users(users, 'احمد').exists())
+
+    def test_export_includes_all_name_matches(self):
+        admin = make_admin()
+        self.client.force_login(admin)
+        response = self.client.get(reverse('export_users'), {'search': 'رضا'})
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        # یک سطر عنوان به علاوه همه کاربران منطبق
+        self.assertEqual(len(lines), 1101)
+
+    def test_export_escapes_formulas(self):
+        admin = make_admin()
+        payloads = ['=HYPERLINK("http://evil.example","x")', '+1+1', '-2+3', '@SUM(A1)', '\tتب', '\rبرگشت']
+        for i, payload in enumerate(payloads):
+            make_user(username=f'formula{i}', national_code=f'{4000000000 + i}', first_name=payload, last_name='رضایی')
+        make_user(username='plain', national_code='4000000099', first_name='رضا', last_name='a-b')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('export_users'))
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = {row[1]: row for row in csv.reader(io.StringIO(content, newline=''))}
+        for i, payload in enumerate(payloads):
+            self.assertEqual(rows[f'formula{i}'][2], f"'{payload}")
+        # مقادیری که فقط در میانه این نویسه‌ها را دارند دست نمی‌خورند
+        self.assertEqual(rows['plain'][2:4], ['رضا', 'a-b'])
+
+
+class MessageSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user()
+
+    def search(self, query, **kwargs):
+        return [(entry.kind, entry.object_id) for entry in search_entries(query, **kwargs)]
+
+    def test_index_follows_contact_messages(self):
+        contact_message = ContactMessage.objects.create(user=self.user, subject='بلیت', message='سانس صبح')
+        self.assertEqual(self.search('سانس'), [('contact', contact_message.pk)])
+
+        contact_message.admin_response = 'ظرفیت تکمیل است'
+        contact_message.save()
+        self.assertEqual(self.search('ظرفیت', kind='contact'), [('contact', contact_message.pk)])
+        # پاسخ ادمین به صورت پیام کاربر هم ایندکس می‌شود
+        self.assertEqual(sorted(kind for kind, _ in self.search('ظرفیت')), ['contact', 'message'])
+
+        contact_message.delete()
+        self.assertEqual(self.search('سانس'), [])
+
+    def test_index_follows_user_messages(self):
+        message = UserMessage.objects.create(
+            user=self.user, is_from_admin=True, message_type='private', subject='استخر',
+            content='تعطیلی جمعه', sender=self.admin
+        )
+        self.assertEqual(self.search('تعطیلی', kind='message'), [('message', message.pk)])
+        self.assertEqual(self.search('تعطیلی', kind='contact'), [])
+
+        message.content = 'بازگشایی شنبه'
+        message.save()
+        self.assertEqual(self.search('تعطیلی'), [])
+        self.assertEqual(self.search('بازگشا'), [('message', message.pk)])
+
+        message.delete()
+        self.assertEqual(self.search('بازگشا'), [])
+
+    @skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'رتبه‌بندی فقط با ایندکس متنی انجام می‌شود')
+    def test_results_are_ranked(self):
+        weak = ContactMessage.objects.create(
+            user=self.user, subject='سوال', message='درباره ساعت کار و هزینه و قوانین و سانس بانوان'
+        )
+        strong = ContactMessage.objects.create(user=self.user, subject='سانس', message='سانس سانس')
+        self.assertEqual(self.search('سانس'), [('contact', strong.pk), ('contact', weak.pk)])
+
+    def test_view_paginates_and_filters_kind(self):
+        for i in range(3):
+            ContactMessage.objects.create(user=self.user, subject=f'شکایت {i}', message='متن')
+        for i in range(SEARCH_RESULTS_PER_PAGE):
+            UserMessage.objects.create(
+                user=self.user, is_from_admin=True, message_type='private', subject=f'شکایت {i}',
+                content='متن', sender=self.admin
+            )
+        self.client.force_login(self.admin)
+        url = reverse('message_search')
+
+        response = self.client.get(url, {'q': 'شکایت'})
+        self.assertEqual(len(response.context['results']), SEARCH_RESULTS_PER_PAGE)
+        self.assertTrue(response.context['has_next'])
+        self.assertFalse(response.context['has_previous'])
+
+        response = self.client.get(url, {'q': 'شکایت', 'page': 2})
+        self.assertEqual(len(response.context['results']), 3)
+        self.assertFalse(response.context['has_next'])
+        self.assertTrue(response.context['has_previous'])
+
+        response = self.client.get(url, {'q': 'شکایت', 'kind': 'message'})
+        self.assertEqual({entry.kind for entry in response.context['results']}, {'message'})
+        self.assertFalse(response.context['has_next'])
+
+    def test_view_requires_admin(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('message_search'), {'q': 'بلیت'})
+        self.assertEqual(response.status_code, 302)
+
+
+class ContentStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = make_users(2)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def save_document(self, user, data=b'%PDF-1.4 letter'):
+        user = CustomUser.objects.get(pk=user.pk)
+        user.job_document.save('letter.pdf', ContentFile(data))
+        return user.job_document.name
+
+    def test_identical_files_share_one_blob(self):
+        names = {self.save_document(user) for user in self.users}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+        self.assertTrue(content_storage.exists(name))
+
+    def test_reupload_of_same_file_keeps_ref_count(self):
+        name = self.save_document(self.users[0])
+        self.save_document(self.users[0])
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+    def test_file_deleted_after_commit_of_last_reference(self):
+        name = self.save_document(self.users[0])
+        self.save_document(self.users[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.get(pk=self.users[0].pk).delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(content_storage.exists(name))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            CustomUser.objects.get(pk=self.users[1].pk).delete()
+        # تا commit فایل حذف نمی‌شود
+        self.assertTrue(content_storage.exists(name))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(content_storage.exists(name))
+
+    def test_upload_before_pending_delete_keeps_file(self):
+        name = self.save_document(self.users[0])
+        with self.captureOnCommitCallbacks() as callbacks:
+            user = CustomUser.objects.get(pk=self.users[0].pk)
+            user.job_document = None
+            user.save()
+        # همان فایل قبل از اجرای حذف دوباره آپلود می‌شود
+        self.save_document(self.users[1])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(content_storage.exists(name))
+
+    def test_upload_after_delete_recreates_file(self):
+        name = self.save_document(self.users[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.get(pk=self.users[0].pk).delete()
+        self.assertFalse(content_storage.exists(name))
+        self.assertEqual(self.save_document(self.users[1]), name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(content_storage.exists(name))
+
+    def test_failed_model_save_does_not_leak_reference(self):
+        user = CustomUser.objects.get(pk=self.users[0].pk)
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            with mock.patch.object(CustomUser, 'save_base', side_effect=DatabaseError('disk full')):
+                user.job_document.save('letter.pdf', ContentFile(b'%PDF-1.4 letter'))
+        name = user.job_document.name
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        # کاربر دیگری به همان فایل اشاره می‌کند؛ ارجاع ذخیره ناموفق نباید به او برسد
+        other = CustomUser.objects.get(pk=self.users[1].pk)
+        other.job_document = name
+        other.save()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def make_photo(self):
+        """عکس افقی ۴۰×۲۰ (نیمه چپ قرمز، نیمه راست آبی) که EXIF آن چرخش ۹۰ درجه را می‌خواهد"""
+        image = Image.new('RGB', (40, 20), (0, 0, 255))
+        image.paste((255, 0, 0), (0, 0, 20, 20))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: چرخش ۹۰ درجه ساعتگرد
+        exif[0x010F] = 'Camera Maker'
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes(), quality=95)
+        return buffer.getvalue()
+
+    def test_render_applies_orientation_and_strips_exif(self):
+        rendered = render_thumbnails(io.BytesIO(self.make_photo()))
+        self.assertEqual(set(rendered), {
+            (size, image_format) for size in PROFILE_THUMBNAIL_SIZES for image_format in THUMBNAIL_FORMATS
+        })
+        for (size, image_format), content in rendered.items():
+            with Image.open(io.BytesIO(content)) as thumbnail:
+                self.assertEqual(thumbnail.format, THUMBNAIL_FORMATS[image_format][0])
+                self.assertEqual(thumbnail.size, (size, size))
+                self.assertNotIn('exif', thumbnail.info)
+                self.assertEqual(dict(thumbnail.getexif()), {})
+        with Image.open(io.BytesIO(rendered[48, 'jpeg'])) as thumbnail:
+            # بعد از چرخش، نیمه قرمز بالا و نیمه آبی پایین است
+            red, _, blue = thumbnail.convert('RGB').getpixel((40, 4))
+            self.assertGreater(red, 200)
+            self.assertLess(blue, 60)
+            red, _, blue = thumbnail.convert('RGB').getpixel((8, 43))
+            self.assertLess(red, 60)
+            self.assertGreater(blue, 200)
+
+    def test_generated_thumbnails_and_srcset(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.profile_image.save('photo.jpg', ContentFile(self.make_photo()))
+        self.assertEqual(generate_profile_thumbnails(user), len(PROFILE_THUMBNAIL_SIZES) * len(THUMBNAIL_FORMATS))
+        self.assertIsNotNone(get_thumbnail(user.profile_image, 96, 'webp'))
+        self.assertEqual(user.get_profile_image_srcset('webp'), ', '.join(
+            f"{reverse('profile_image_thumbnail', args=[user.pk, size, 'webp'])} {size}w"
+            for size in PROFILE_THUMBNAIL_SIZES
+        ))
+        self.client.force_login(user)
+        response = self.client.get(reverse('profile_image_thumbnail', args=[user.pk, 96, 'webp']))
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (96, 96)))
+
+
+class RangeTests(TestCase):
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+        for header in ('bytes=1000-', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 1000)
+
+    def test_empty_file_is_unsatisfiable(self):
+        for header in ('bytes=-500', 'bytes=0-', 'bytes=0-10'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 0)
+
+    def test_empty_file_range_response(self):
+        with tempfile.NamedTemporaryFile() as f:
+            etag, last_modified, size = file_validators(f.name)
+            request = RequestFactory().get('/', headers={'Range': 'bytes=-500'})
+            response = send_file(request, f.name, 'application/pdf', etag, last_modified, size)
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+
+@mock.patch.object(broadcasts, 'BROADCAST_CHUNK_SIZE', 3)
+class BroadcastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        make_users(7, prefix='worker', user_type='worker')
+
+    def start(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('broadcast'), {
+            'user_type': 'worker', 'message_type': 'private', 'subject': 'اطلاعیه', 'content': 'استخر تعطیل است'
+        })
+        self.assertEqual(response.status_code, 302)
+        return Broadcast.objects.get()
+
+    def run_job(self):
+        [job] = claim_jobs(1)
+        try:
+            execute_job(job.name, job.payload)
+        except Exception as e:
+            finish_job(job, str(e))
+        else:
+            finish_job(job)
+
+    def test_broadcast_runs_as_job(self):
+        broadcast = self.start()
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload), ('broadcast', {'broadcast_id': broadcast.pk}))
+        self.run_job()
+        broadcast.refresh_from_db()
+        self.assertEqual((broadcast.status, broadcast.sent_count, broadcast.total_recipients), ('done', 7, 7))
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_failed_broadcast_resumes_without_duplicates(self):
+        broadcast = self.start()
+        bulk_send = UserMessage.objects.bulk_send
+        calls = []
+
+        def fail_second_chunk(user_ids, **kwargs):
+            calls.append(user_ids)
+            if len(calls) == 2:
+                raise RuntimeError('database unavailable')
+            return bulk_send(user_ids, **kwargs)
+
+        with mock.patch.object(UserMessage.objects, 'bulk_send', side_effect=fail_second_chunk):
+            self.run_job()
+        broadcast.refresh_from_db()
+        self.assertEqual((broadcast.status, broadcast.sent_count), ('failed', 3))
+        self.assertEqual(broadcast.last_recipient_id, calls[0][-1])
+        job = Job.objects.get()
+        self.assertEqual(job.status, 'pending')
+
+        Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+        self.run_job()
+        broadcast.refresh_from_db()
+        self.assertEqual((broadcast.status, broadcast.sent_count, broadcast.total_recipients), ('done', 7, 7))
+        self.assertEqual(UserMessage.objects.filter(subject='اطلاعیه').count(), 7)
+
+
+class CursorPaginationLinkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user()
+        for i in range(25):
+            ContactMessage.objects.create(user=cls.user, subject=f'تماس {i}', message='متن')
+            UserMessage.objects.create(
+                user=cls.user, is_from_admin=False, message_type='private',
+                subject=f'پیام {i}', content='متن', sender=cls.user
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_dashboard_links_keep_other_list_cursor(self):
+        private_cursor = self.client.get(reverse('dashboard')).context['private_messages'].next_cursor
+        response = self.client.get(reverse('dashboard'), {'private_after': private_cursor})
+        contact_cursor = response.context['contact_messages'].next_cursor
+        next_contact = urlencode({'private_after': private_cursor, 'contact_after': contact_cursor})
+        self.assertContains(response, f'href="?{next_contact}"'.replace('&', '&amp;'))
+        self.assertEqual(
+            [message.subject for message in response.context['private_messages']],
+            [f'پیام {i}' for i in range(14, 4, -1)]
+        )
+
+    def test_user_list_links_keep_filters(self):
+        make_users(25, prefix='worker', user_type='worker')
+        response = self.client.get(reverse('user_management'), {'user_type': 'worker'})
+        cursor = response.context['users'].next_cursor
+        self.assertContains(response, f'href="?{urlencode({"user_type": "worker", "after": cursor})}"'.replace('&', '&amp;'))
+
+
+class AgeGroupTests(TestCase):
+    # ۲۲:۰۰ به وقت UTC، ساعت ۱:۳۰ روز بعد به وقت تهران است
+    NOW = datetime.datetime(2026, 3, 20, 22, 0, tzinfo=datetime.timezone.utc)
+
+    def test_today_is_local_date_everywhere(self):
+        birth_date = datetime.date(2001, 3, 21)
+        with mock.patch('django.utils.timezone.now', return_value=self.NOW):
+            self.assertEqual(local_today(), datetime.date(2026, 3, 21))
+            self.assertEqual(age_group_for(birth_date), 'over_25')
+            user = make_user(username='member', birth_date=birth_date)
+            self.assertEqual(user.age_group, 'over_25')
+            self.assertEqual(user.calculate_age(), 25)
+            # recompute_age_groups با همان «امروز» چیزی برای اصلاح پیدا نمی‌کند
+            CustomUser.objects.filter(pk=user.pk).update(age_group='15_25')
+            call_command('recompute_age_groups', stdout=io.StringIO())
+        user.refresh_from_db()
+        self.assertEqual(user.age_group, 'over_25')
+
+
+class UnreadCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.users = make_users(3)
+        cls.user = cls.users[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def send(self, user=None, **fields):
+        fields = {
+            'is_from_admin': True, 'message_type': 'private', 'subject': 'اطلاعیه',
+            'content': 'متن', 'sender': self.admin, **fields,
+        }
+        return UserMessage.objects.create(user=user or self.user, **fields)
+
+    def assertUnreadCount(self, user, count):
+        self.assertEqual(CustomUser.objects.get(pk=user.pk).unread_messages_count, count)
+        self.assertEqual(get_unread_count(user.pk), count)
+
+    def test_create(self):
+        self.send()
+        self.send(is_read=True)
+        self.send(is_from_admin=False, sender=self.user)
+        self.assertUnreadCount(self.user, 1)
+
+    def test_mark_read(self):
+        message = self.send()
+        self.send()
+        UserMessage.objects.get(pk=message.pk).mark_as_read()
+        UserMessage.objects.get(pk=message.pk).mark_as_read()
+        self.assertUnreadCount(self.user, 1)
+
+    def test_reading_message_page_marks_read(self):
+        message = self.send()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('view_my_message_detail', args=[message.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertUnreadCount(self.user, 0)
+
+    def test_delete(self):
+        unread = self.send()
+        read = self.send(is_read=True)
+        self.send()
+        UserMessage.objects.get(pk=read.pk).delete()
+        self.assertUnreadCount(self.user, 2)
+        UserMessage.objects.get(pk=unread.pk).delete()
+        self.assertUnreadCount(self.user, 1)
+        UserMessage.objects.filter(user=self.user).delete()
+        self.assertUnreadCount(self.user, 0)
+
+    def test_bulk_send(self):
+        fields = {
+            'is_from_admin': True, 'message_type': 'private', 'subject': 'اطلاعیه',
+            'content': 'متن', 'sender_id': self.admin.pk,
+        }
+        user_ids = [user.pk for user in self.users]
+        UserMessage.objects.bulk_send(user_ids, is_read=False, **fields)
+        UserMessage.objects.bulk_send(user_ids, is_read=True, **fields)
+        UserMessage.objects.bulk_send(user_ids[:1], is_read=False, **fields)
+        self.assertUnreadCount(self.users[0], 2)
+        for user in self.users[1:]:
+            self.assertUnreadCount(user, 1)
+
+    def test_cached_count_expires(self):
+        # پروسه دیگری شمارنده را تغییر داده و cache محلی این پروسه را پاک نکرده است
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+        CustomUser.objects.filter(pk=self.user.pk).update(unread_messages_count=2)
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+        with mock.patch('time.time', return_value=time.time() + UNREAD_COUNT_CACHE_TTL + 1):
+            self.assertEqual(get_unread_count(self.user.pk), 2)
+
+    def test_reconcile_fixes_drift(self):
+        self.send()
+        CustomUser.objects.filter(pk=self.user.pk).update(unread_messages_count=5)
+        call_command('reconcile_unread_counts', stdout=io.StringIO())
+        self.assertUnreadCount(self.user, 1)
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(username='member')
+        for i in range(23):
+            ContactMessage.objects.create(user=cls.user, subject=f'تماس {i}', message='متن')
+        # زمان یکسان برای نیمی از ردیف‌ها تا ترتیب با id شکسته شود
+        ContactMessage.objects.filter(pk__in=ContactMessage.objects.order_by('pk').values('pk')[5:15]).update(
+            created_at=timezone.now()
+        )
+
+    def setUp(self):
+        self.paginator = CursorPaginator(ContactMessage.objects.all(), 5)
+        self.expected = list(ContactMessage.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def walk_forward(self):
+        pages = [self.paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(self.paginator.get_page(after=pages[-1].next_cursor))
+        return pages
+
+    def test_forward_pages_cover_list_once(self):
+        pages = self.walk_forward()
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+        self.assertEqual([message.pk for page in pages for message in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+        self.assertTrue(all(page.has_previous for page in pages[1:]))
+
+    def test_backward_pages_match_forward_pages(self):
+        pages = self.walk_forward()
+        page = pages[-1]
+        for expected_page in reversed(pages[:-1]):
+            page = self.paginator.get_page(before=page.previous_cursor)
+            self.assertEqual([message.pk for message in page], [message.pk for message in expected_page])
+        self.assertFalse(page.has_previous)
+
+    def test_new_rows_do_not_shift_next_page(self):
+        first = self.paginator.get_page()
+        ContactMessage.objects.create(user=self.user, subject='جدید', message='متن')
+        second = self.paginator.get_page(after=first.next_cursor)
+        self.assertEqual([message.pk for message in second], self.expected[5:10])
+
+    def test_ascending_ordering(self):
+        paginator = CursorPaginator(ContactMessage.objects.all(), 10, ordering=('created_at', 'id'))
+        first = paginator.get_page()
+        second = paginator.get_page(after=first.next_cursor)
+        self.assertEqual([message.pk for message in [*first, *second]], self.expected[::-1][:20])
+
+    def test_invalid_cursor_returns_first_page(self):
+        for cursor in ('garbage', 'W10', '!!!'):
+            page = self.paginator.get_page(after=cursor)
+            self.assertEqual([message.pk for message in page], self.expected[:5])
+
+    def test_my_messages_tabs_page_separately(self):
+        admin = make_admin()
+        for i in range(20):
+            UserMessage.objects.create(
+                user=self.user, is_from_admin=True, message_type='private', subject=f'دریافتی {i}',
+                content='متن', sender=admin
+            )
+            UserMessage.objects.create(
+                user=self.user, is_from_admin=False, message_type='private', subject=f'ارسالی {i}',
+                content='متن', sender=self.user
+            )
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('my_messages'))
+        self.assertEqual(response.context['total_contact'], 23)
+        tabs = ('received_messages', 'sent_messages', 'contact_messages')
+        for name in tabs:
+            self.assertEqual(len(response.context[name]), 15)
+            self.assertTrue(response.context[name].has_next)
+
+        cursor = response.context['received_messages'].next_cursor
+        self.assertContains(response, f'href="?received_after={cursor}#received"')
+        response = self.client.get(reverse('my_messages'), {'received_after': cursor})
+        self.assertEqual(
+            [message.subject for message in response.context['received_messages']],
+            [f'دریافتی {i}' for i in range(4, -1, -1)]
+        )
+        # تب‌های دیگر در صفحه اول می‌مانند و cursor تب دریافتی در لینک‌هایشان حفظ می‌شود
+        self.assertEqual(len(response.context['sent_messages']), 15)
+        self.assertFalse(response.context['contact_messages'].has_previous)
+        cursor = response.context['contact_messages'].next_cursor
+        query = urlencode({'received_after': response.wsgi_request.GET['received_after'], 'contact_after': cursor})
+        self.assertContains(response, f'href="?{query}#contact"'.replace('&', '&amp;'))
+
+
+class ConversationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user()
+        cls.messages = [
+            UserMessage.objects.create(
+                user=cls.user, is_from_admin=True, message_type='private', subject=f'پیام {i}',
+                content='متن', sender=cls.admin, is_read=True
+            )
+            for i in range(45)
+        ]
+        cls.conversation = cls.messages[0].conversation
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def open(self, message, **params):
+        response = self.client.get(reverse('view_my_message_detail', args=[message.pk]), params)
+        return response.context['conversation_page'], [msg.pk for msg in response.context['conversation_messages']]
+
+    def test_counts(self):
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 45)
+        self.assertEqual(self.conversation.last_message_at, self.messages[-1].created_at)
+        self.assertEqual(set(self.conversation.participants.all()), {self.admin, self.user})
+        self.messages[-1].delete()
+        UserMessage.objects.bulk_send(
+            [self.user.pk], is_read=True, is_from_admin=True, message_type='private',
+            subject='اطلاعیه', content='متن', sender_id=self.admin.pk
+        )
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 45)
+        self.assertEqual(self.user.conversations.count(), 1)
+
+    def test_opened_message_page(self):
+        ids = [message.pk for message in self.messages]
+        # جدیدترین پیام: صفحه اول
+        page, shown = self.open(self.messages[-1])
+        self.assertEqual(shown, ids[-20:])
+        self.assertFalse(page.has_previous)
+        # پیام وسط گفتگو جدیدترین پیام صفحه خودش است
+        page, shown = self.open(self.messages[30])
+        self.assertEqual(shown, ids[11:31])
+        self.assertTrue(page.has_previous and page.has_next)
+        # کمتر از یک صفحه پیام قدیمی‌تر
+        page, shown = self.open(self.messages[5])
+        self.assertEqual(shown, ids[:6])
+        self.assertFalse(page.has_next)
+
+    def test_cursor_overrides_opened_message(self):
+        ids = [message.pk for message in self.messages]
+        page, _ = self.open(self.messages[30])
+        _, shown = self.open(self.messages[30], after=page.next_cursor)
+        self.assertEqual(shown, ids[:11])
+        _, shown = self.open(self.messages[30], before=page.previous_cursor)
+        self.assertEqual(shown, ids[31:])
+
+
+class ImportUsersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_user(username='existing', national_code='2000000009')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def import_file(self, name, content, *args):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        call_command('import_users', path, '--workers', '1', '--chunk-size', '2', *args, stdout=io.StringIO())
+        with open(f'{path}.rejects.csv', encoding='utf-8') as f:
+            return {int(line): errors for line, errors, _ in list(csv.reader(f))[1:]}
+
+    def test_csv_import(self):
+        child_birth_date = years_ago(local_today(), 3)
+        rejects = self.import_file('users.csv', '\n'.join([
+            'username,national_code,phone_number,first_name,last_name,email,birth_date,user_type,password',
+            'ali,2000000001,09120000001,علی,رضایی,ali@example.com,1380/01/01,worker,secret-1',
+            f',2000000002,,سارا,نادری,,{child_birth_date.isoformat()},,secret-2',
+            'ali,2000000003,,,,,,,',
+            'reza,2000000009,,,,,,,',
+            'bad,123,0912,,,,,,',
+            'future,2000000004,,,,,2999-01-01,,',
+        ]))
+        self.assertEqual(sorted(rejects), [4, 5, 6, 7])
+        self.assertIn('تکراری در فایل', rejects[4])
+        self.assertIn('قبلاً ثبت شده است', rejects[5])
+        self.assertIn('national_code', rejects[6])
+        self.assertIn('phone_number', rejects[6])
+        self.assertIn('آینده', rejects[7])
+
+        ali = CustomUser.objects.get(username='ali')
+        self.assertTrue(ali.check_password('secret-1'))
+        self.assertEqual((ali.user_type, ali.birth_date, ali.age_group), ('worker', datetime.date(2001, 3, 21), 'over_25'))
+        sara = CustomUser.objects.get(national_code='2000000002')
+        self.assertEqual((sara.username, sara.user_type, sara.age_group), ('2000000002', 'normal', 'under_7'))
+        self.assertEqual(list(filter_users(CustomUser.objects.all(), 'ناد')), [sara])
+
+    def test_jsonl_import(self):
+        rejects = self.import_file('users.jsonl', '\n'.join([
+            '{"national_code": "2000000001", "first_name": "علی", "password": "secret"}',
+            'not json',
+            '["2000000002"]',
+            '',
+            '{"national_code": "2000000003"}',
+        ]), '--user-type', 'employee')
+        self.assertEqual(sorted(rejects), [2, 3])
+        users = CustomUser.objects.filter(national_code__in=['2000000001', '2000000003'])
+        self.assertEqual(set(users.values_list('user_type', flat=True)), {'employee'})
+        self.assertFalse(CustomUser.objects.get(national_code='2000000003').has_usable_password())
+
+
+class BulkUserActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.users = make_users(3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def post(self, action, user_ids, **data):
+        return self.client.post(reverse('bulk_user_action'), {'action': action, 'user_ids': user_ids, **data})
+
+    def test_set_type(self):
+        user_ids = [user.pk for user in self.users[:2]]
+        with CaptureQueriesContext(connection) as context:
+            response = self.post('set_type', user_ids, user_type='worker')
+        # همه کاربران انتخاب شده با یک UPDATE تغییر می‌کنند
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertRedirects(response, reverse('user_management'))
+        types = dict(CustomUser.objects.filter(pk__in=[user.pk for user in self.users]).values_list('pk', 'user_type'))
+        self.assertEqual(types, {self.users[0].pk: 'worker', self.users[1].pk: 'worker', self.users[2].pk: 'normal'})
+
+    def test_deactivate_skips_acting_admin(self):
+        user_ids = [self.admin.pk, self.users[0].pk]
+        self.post('deactivate', user_ids)
+        self.assertTrue(CustomUser.objects.get(pk=self.admin.pk).is_active)
+        self.assertFalse(CustomUser.objects.get(pk=self.users[0].pk).is_active)
+        self.post('activate', user_ids)
+        self.assertTrue(CustomUser.objects.get(pk=self.users[0].pk).is_active)
+
+    def test_deactivated_user_is_logged_out(self):
+        member = self.client_class()
+        member.force_login(self.users[0])
+        self.assertEqual(member.get(reverse('profile')).status_code, 200)
+        self.post('deactivate', [self.users[0].pk])
+        response = member.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response.url)
+
+    def test_invalid_requests_change_nothing(self):
+        self.post('set_type', [self.users[0].pk])
+        self.post('deactivate', [])
+        self.post('deactivate', ['abc'])
+        self.assertEqual(CustomUser.objects.filter(is_active=True, user_type='normal').count(), 4)
+
+    def test_redirects_only_to_local_next(self):
+        next_url = f"{reverse('user_management')}?user_type=worker"
+        response = self.post('activate', [self.users[0].pk], next=next_url)
+        self.assertRedirects(response, next_url)
+        response = self.post('activate', [self.users[0].pk], next='https://example.com/')
+        self.assertRedirects(response, reverse('user_management'))
+
+
+class ConditionalGetTests(TestCase):
+    DOCUMENT = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_admin()
+        cls.user = make_user(username='member')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.job_document.save('letter.pdf', ContentFile(self.DOCUMENT))
+        self.client.force_login(self.admin)
+        self.url = reverse('view_job_document', args=[self.user.pk])
+
+    def test_validators_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.DOCUMENT)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(self.url, headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_download_filename(self):
+        response = self.client.get(reverse('download_job_document', args=[self.user.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn('job_document_member.pdf', response['Content-Disposition'])
+
+    def test_range_and_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'Range': 'bytes=9-18', 'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 9-18/{len(self.DOCUMENT)}')
+        self.assertEqual(b''.join(response.streaming_content), self.DOCUMENT[9:19])
+        # نسخه تغییر کرده: کل فایل ارسال می‌شود
+        response = self.client.get(self.url, headers={'Range': 'bytes=9-18', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.DOCUMENT)}-'})
+        self.assertEqual(response.status_code, 416)
+
+    def test_profile_image_not_modified(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.profile_image.save('photo.png', ContentFile(b'\x89PNG image'))
+        url = reverse('profile_image', args=[self.user.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        handlers = mock.patch.dict(JOB_HANDLERS, {'record': (self.record, False), 'explode': (self.explode, False)})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def record(self, value):
+        self.calls.append(value)
+
+    def explode(self):
+        raise RuntimeError('boom')
+
+    def run_claimed(self, limit=10):
+        for job in claim_jobs(limit):
+            try:
+                execute_job(job.name, job.payload)
+            except Exception as e:
+                finish_job(job, format_error(e))
+            else:
+                finish_job(job)
+
+    def test_enqueue_unknown_job(self):
+        with self.assertRaises(ValueError):
+            enqueue('missing')
+
+    def test_claim_order_limit_and_schedule(self):
+        jobs = [enqueue('record', value=i) for i in range(3)]
+        Job.objects.filter(pk=jobs[0].pk).update(run_at=timezone.now() + datetime.timedelta(minutes=5))
+        claimed = claim_jobs(1)
+        self.assertEqual([job.pk for job in claimed], [jobs[1].pk])
+        self.assertEqual((claimed[0].status, claimed[0].attempts), ('running', 1))
+        # کار برداشته شده دوباره برداشته نمی‌شود و کار آینده هنوز آماده نیست
+        self.assertEqual([job.pk for job in claim_jobs(10)], [jobs[2].pk])
+        self.assertEqual(claim_jobs(10), [])
+
+    def test_successful_job(self):
+        job = enqueue('record', value='a')
+        self.run_claimed()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('done', 1, ''))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.calls, ['a'])
+
+    def test_retry_with_backoff_then_fail(self):
+        job = enqueue('explode', max_attempts=3)
+        for attempt, delay in ((1, JOB_RETRY_DELAY), (2, JOB_RETRY_DELAY * 2)):
+            before = timezone.now()
+            self.run_claimed()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('pending', attempt))
+            self.assertIn('RuntimeError: boom', job.last_error)
+            self.assertGreaterEqual(job.run_at, before + datetime.timedelta(seconds=delay))
+            self.assertEqual(claim_jobs(10), [])
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.run_claimed()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+
+    def test_release_stale_jobs(self):
+        job = enqueue('record', value='b')
+        claim_jobs(1)
+        self.assertEqual(release_stale_jobs(60), 0)
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(release_stale_jobs(60), 1)
+        self.run_claimed()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+
+    def test_stale_job_on_last_attempt_fails(self):
+        job = enqueue('record', max_attempts=1, value='d')
+        claim_jobs(1)
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(release_stale_jobs(60), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.assertEqual(claim_jobs(10), [])
+
+    def test_stale_threshold_per_job_name(self):
+        slow, fast = enqueue('record', value='slow'), enqueue('explode')
+        claim_jobs(10)
+        Job.objects.update(started_at=timezone.now() - datetime.timedelta(minutes=5))
+        with mock.patch.dict(JOB_STALE_AFTER, {'record': 3600}):
+            self.assertEqual(release_stale_jobs(60), 1)
+        self.assertEqual(Job.objects.get(pk=slow.pk).status, 'running')
+        self.assertEqual(Job.objects.get(pk=fast.pk).status, 'pending')
+
+    @mock.patch('accounts.management.commands.run_jobs.ProcessPoolExecutor')
+    def test_run_jobs_rebuilds_broken_pool(self, executor_class):
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+        executor_class.return_value.submit.return_value = future
+        JOB_HANDLERS['crunch'] = (self.record, True)
+        job = enqueue('crunch', value='e')
+        call_command('run_jobs', '--once', '--workers', '1', stdout=io.StringIO())
+        self.assertEqual(executor_class.call_count, 2)
+        # processهای pool اتصال دیتابیس process اصلی را به ارث نمی‌برند
+        self.assertEqual(executor_class.call_args.kwargs['mp_context'].get_start_method(), 'spawn')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertIn('BrokenProcessPool', job.last_error)
+
+    def test_run_jobs_command(self):
+        enqueue('record', value='c')
+        unknown = Job.objects.create(name='unregistered')
+        call_command('run_jobs', '--once', '--workers', '0', stdout=io.StringIO())
+        self.assertEqual(self.calls, ['c'])
+        unknown.refresh_from_db()
+        # کار ثبت نشده بدون تلاش دوباره ناموفق می‌شود
+        self.assertEqual(unknown.status, 'failed')
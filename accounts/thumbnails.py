@@ -0,0 +1,87 @@
+"""
+تصاویر کوچک عکس پروفایل.
+
+بعد از آپلود عکس (فرم ثبت نام و ویرایش پروفایل) برای هر اندازه
+PROFILE_THUMBNAIL_SIZES یک نسخه مربعی WebP و یک نسخه JPEG ساخته می‌شود تا
+صفحات لیست به جای عکس اصلی چند مگابایتی، تصویر چند کیلوبایتی بارگذاری کنند.
+اطلاعات EXIF (مکان، مدل دوربین و ...) در تصاویر کوچک ذخیره نمی‌شود.
+"""
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# عرض تصاویر (پیکسل)؛ برای نمایش ۴۰ تا ۱۵۰ پیکسلی در صفحه‌های عادی و retina
+PROFILE_THUMBNAIL_SIZES = (48, 96, 160, 320)
+
+# فرمت، (فرمت Pillow، تنظیمات ذخیره)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_name(user_id, size, image_format):
+    return f'profile_images/thumbs/{user_id}/{size}.{image_format}'
+
+
+def get_thumbnail(field_file, size, image_format):
+    """FieldFile تصویر کوچک ساخته شده، یا None اگر (هنوز) وجود ندارد"""
+    name = thumbnail_name(field_file.instance.pk, size, image_format)
+    if not default_storage.exists(name):
+        return None
+    return field_file.field.attr_class(field_file.instance, field_file.field, name)
+
+
+def render_thumbnails(source):
+    """{(اندازه، فرمت): bytes} برای تصویر source (فایل یا مسیر)"""
+    with Image.open(source) as image:
+        # جهت عکس‌های موبایل در EXIF است؛ قبل از حذف EXIF روی پیکسل‌ها اعمال می‌شود
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+
+        rendered = {}
+        for size in PROFILE_THUMBNAIL_SIZES:
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            for image_format, (pil_format, options) in THUMBNAIL_FORMATS.items():
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, pil_format, **options)
+                rendered[size, image_format] = buffer.getvalue()
+        return rendered
+
+
+def delete_profile_thumbnails(storage, user_id):
+    for size in PROFILE_THUMBNAIL_SIZES:
+        for image_format in THUMBNAIL_FORMATS:
+            storage.delete(thumbnail_name(user_id, size, image_format))
+
+
+def generate_profile_thumbnails(user):
+    """ساخت دوباره تصاویر کوچک عکس پروفایل کاربر (و حذف نسخه‌های قبلی)"""
+    field_file = user.profile_image
+    # تصاویر کوچک نام ثابتی (بر اساس شناسه کاربر) دارند و در storage پیش‌فرض ذخیره می‌شوند
+    storage = default_storage
+    delete_profile_thumbnails(storage, user.pk)
+    if not field_file or not field_file.storage.exists(field_file.name):
+        return 0
+
+    try:
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            rendered = render_thumbnails(source)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.error(f"خطا در ساخت تصویر کوچک عکس پروفایل کاربر {user.pk}: {str(e)}")
+        return 0
+
+    for (size, image_format), content in rendered.items():
+        storage.save(thumbnail_name(user.pk, size, image_format), ContentFile(content))
+    return len(rendered)
@@ -0,0 +1,35 @@
+"""
+upload handlerهایی که hash محتوای فایل را همزمان با دریافت تکه‌ها محاسبه
+می‌کنند تا ContentAddressedStorage برای پیدا کردن نام فایل آن را دوباره نخواند.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class ContentHashMixin:
+    def new_file(self, *args, **kwargs):
+        self.content_hash = hashlib.sha256()
+        # MemoryFileUploadHandler در صورت فعال بودن StopFutureHandlers می‌دهد
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        result = super().receive_data_chunk(raw_data, start)
+        if result is None:
+            # این handler تکه را ذخیره کرده است
+            self.content_hash.update(raw_data)
+        return result
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.content_hash.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    pass
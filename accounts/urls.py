@@ -6,6 +6,8 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('profile/', views.profile_view, name='profile'),
+    path('users/<int:user_id>/profile-image/', views.profile_image_view, name='profile_image'),
+    path('users/<int:user_id>/profile-image/<int:size>.<slug:image_format>', views.profile_image_view, name='profile_image_thumbnail'),
 
 
     path('dashboard/', views.dashboard_view, name='dashboard'),
@@ -16,15 +18,22 @@ urlpatterns = [
     path('messages/', views.my_messages_view, name='my_messages'),
     path('messages/<int:message_id>/', views.view_my_message_detail, name='view_my_message_detail'),
     path('send-private-message/', views.send_private_message_view, name='send_private_message'),
+    path('messages/stream/', views.notifications_stream_view, name='notifications_stream'),
+    path('messages/poll/', views.notifications_poll_view, name='notifications_poll'),
     
     # URLهای ادمین برای پیام‌رسانی
     path('send-message/', views.send_message_to_user_view, name='send_message'),
     path('send-message/<int:user_id>/', views.send_message_to_user_view, name='send_message_to_user'),
     path('send-message/<int:user_id>/<int:message_id>/', views.send_message_to_user_view, name='reply_to_message'),
     path('respond/<int:message_id>/', views.respond_message_view, name='respond_message'),
+    path('broadcast/', views.broadcast_view, name='broadcast'),
+    path('messages/search/', views.message_search_view, name='message_search'),
 
         # مدیریت کاربران توسط ادمین
     path('admin/users/', views.user_management_view, name='user_management'),
+    path('admin/users/autocomplete/', views.user_autocomplete_view, name='user_autocomplete'),
+    path('admin/users/export/', views.export_users_view, name='export_users'),
+    path('admin/users/bulk-action/', views.bulk_user_action_view, name='bulk_user_action'),
     path('admin/users/<int:user_id>/', views.view_user_detail, name='user_detail'),
     path('admin/users/<int:user_id>/update-type/', views.update_user_type, name='update_user_type'),
     path('admin/users/<int:user_id>/view-document/', views.view_job_document, name='view_job_document'),
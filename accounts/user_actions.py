@@ -0,0 +1,35 @@
+import logging
+
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+# بعد از تغییر گروهی کاربران با update() ارسال می‌شود (post_save اجرا نمی‌شود)
+# آرگومان‌ها: user_ids، fields (دیکشنری فیلدهای تغییر یافته)
+users_bulk_updated = Signal()
+
+
+def bulk_update_users(user_ids, actor, **fields):
+    """
+    تغییر یک یا چند فیلد برای گروهی از کاربران با یک UPDATE ... WHERE id IN (...)
+    و ثبت آن در لاگ. تعداد کاربران تغییر یافته برگردانده می‌شود.
+    """
+    user_ids = list(user_ids)
+    if fields.get('is_active') is False:
+        # ادمین نمی‌تواند حساب خودش را غیرفعال کند
+        user_ids = [user_id for user_id in user_ids if user_id != actor.pk]
+    if not user_ids:
+        return 0
+
+    updated = CustomUser.objects.filter(pk__in=user_ids).update(updated_at=timezone.now(), **fields)
+
+    changes = '، '.join(f'{name}={value}' for name, value in fields.items())
+    logger.info(
+        f"تغییر گروهی {updated} کاربر توسط ادمین {actor.username}: {changes} "
+        f"(شناسه‌ها: {', '.join(map(str, user_ids))})"
+    )
+    users_bulk_updated.send(sender=CustomUser, user_ids=user_ids, fields=fields)
+    return updated
@@ -1,51 +1,109 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, FileResponse
-from django.contrib.auth import login, authenticate, logout
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.auth import alogin, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.utils import timezone
-from django.db.models import Q
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.db import connection
+from django.db.models import Q, Count
+from asgiref.sync import sync_to_async
 from .forms import (
     CustomUserCreationForm, LoginForm, ProfileUpdateForm, 
     ContactForm, AdminResponseForm, AdminToUserMessageForm,
-    UserToAdminMessageForm, UserTypeUpdateForm
+    UserToAdminMessageForm, UserTypeUpdateForm, BroadcastForm,
+    BulkUserActionForm
 )
-from .models import CustomUser, ContactMessage, UserMessage
+from .models import CustomUser, ContactMessage, Conversation, UserMessage, Broadcast, SearchEntry
+from .broadcast import start_broadcast
+from .pagination import CursorPaginator
+from .counters import get_unread_count
+from .files import file_response
+from .hashers import amake_password
+from .notifications import get_broker
+from .senders import get_system_sender_id
+from .search import MESSAGE_KINDS, filter_users, search_entries
+from .stats import get_dashboard_stats
+from .thumbnails import PROFILE_THUMBNAIL_SIZES, THUMBNAIL_FORMATS, get_thumbnail
+from .user_actions import bulk_update_users
+from .templatetags.jalali_tags import to_jalali
+import asyncio
+import csv
+import json
 import logging
 import os
+import time
 
 logger = logging.getLogger(__name__)
 
+MESSAGES_PER_PAGE = 15
+CONVERSATION_PAGE_SIZE = 20
+NOTIFICATION_HEARTBEAT_SECONDS = 20
+SEARCH_RESULTS_PER_PAGE = 20
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MIN_LENGTH = 2
+USER_EXPORT_CHUNK_SIZE = 2000
+USER_EXPORT_COLUMNS = (
+    ('id', 'شناسه'),
+    ('username', 'نام کاربری'),
+    ('first_name', 'نام'),
+    ('last_name', 'نام خانوادگی'),
+    ('national_code', 'کد ملی'),
+    ('phone_number', 'شماره موبایل'),
+    ('email', 'ایمیل'),
+    ('user_type', 'نوع کاربر'),
+    ('age_group', 'گروه سنی'),
+    ('birth_date', 'تاریخ تولد'),
+    ('is_active', 'فعال'),
+    ('date_joined', 'تاریخ عضویت'),
+)
+# سلولی که با این نویسه‌ها شروع شود در Excel/LibreOffice فرمول حساب می‌شود
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
 def is_admin(user):
     return user.is_staff
 
-def register_view(request):
+def get_conversation_page(request, conversation, message=None):
+    """
+    پیام‌های یک گفتگو به ترتیب زمانی، به همراه صفحه cursor برای پیام‌های قدیمی‌تر.
+    بدون cursor در آدرس، صفحه‌ای نمایش داده می‌شود که message (پیام باز شده) جدیدترین
+    پیام آن است؛ در غیر این صورت جدیدترین پیام‌های گفتگو.
+    """
+    if conversation is None:
+        return None, []
+    paginator = CursorPaginator(conversation.messages.all(), CONVERSATION_PAGE_SIZE)
+    if message is not None and not (request.GET.get('after') or request.GET.get('before')):
+        page = paginator.get_page_containing(message)
+    else:
+        page = paginator.get_page_from_request(request)
+    return page, list(reversed(page.object_list))
+
+async def register_view(request):
+    """ثبت نام؛ async تا hash رمز عبور در thread pool محدود انجام شود و worker را مشغول نکند"""
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST, request.FILES)
-        if form.is_valid():
-            user = form.save()
-            login(request, user)
+        if await sync_to_async(form.is_valid)():
+            form.password_hash = await amake_password(form.cleaned_data['password1'])
+            user = await sync_to_async(form.save)()
+            await alogin(request, user)
             messages.success(request, 'ثبت‌نام با موفقیت انجام شد!')
             return redirect('home')
     else:
         form = CustomUserCreationForm()
-    return render(request, 'accounts/register.html', {'form': form})
+    return await sync_to_async(render)(request, 'accounts/register.html', {'form': form})
 
-def login_view(request):
+async def login_view(request):
+    """ورود؛ بررسی رمز عبور (و hash دوباره آن) در thread pool محدود انجام می‌شود"""
     if request.method == 'POST':
-        form = LoginForm(request.POST)
-        if form.is_valid():
-            username = form.cleaned_data['username']
-            password = form.cleaned_data['password']
-            user = authenticate(username=username, password=password)
-            if user:
-                login(request, user)
-                messages.success(request, 'ورود موفقیت‌آمیز بود!')
-                return redirect('home')
+        form = LoginForm(request.POST, request=request)
+        if await form.ais_valid():
+            await alogin(request, form.get_user())
+            messages.success(request, 'ورود موفقیت‌آمیز بود!')
+            return redirect('home')
     else:
-        form = LoginForm()
-    return render(request, 'accounts/login.html', {'form': form})
+        form = LoginForm(request=request)
+    return await sync_to_async(render)(request, 'accounts/login.html', {'form': form})
 
 def logout_view(request):
     logout(request)
@@ -76,45 +134,36 @@ def profile_view(request):
 @login_required
 @user_passes_test(is_admin)
 def dashboard_view(request):
-    user_stats = {
-        'total': CustomUser.objects.count(),
-        'normal': CustomUser.objects.filter(user_type='normal').count(),
-        'worker': CustomUser.objects.filter(user_type='worker').count(),
-        'employee': CustomUser.objects.filter(user_type='employee').count(),
-    }
+    stats = get_dashboard_stats()
     
     # پیام‌های تماس
-    contact_messages = ContactMessage.objects.all().order_by('-created_at')
-    pending_contact_messages = contact_messages.filter(status='pending')
+    contact_messages = ContactMessage.objects.select_related('user').order_by('-created_at')
     
 
     # پیام‌های شخصی کاربران به ادمین
     private_messages = UserMessage.objects.filter(
         is_from_admin=False,
         message_type='private'
-    ).order_by('-created_at')
-    
-    pending_private_messages = private_messages.filter(is_read=False)
+    ).select_related('user').order_by('-created_at')
     
 
-    # صفحه‌بندی پیام‌های تماس
-    contact_paginator = Paginator(contact_messages, 10)
-    contact_page_number = request.GET.get('contact_page')
-    contact_page_obj = contact_paginator.get_page(contact_page_number)
+    # صفحه‌بندی cursor پیام‌های تماس (بدون COUNT و OFFSET)
+    contact_paginator = CursorPaginator(contact_messages, 10)
+    contact_page_obj = contact_paginator.get_page_from_request(request, prefix='contact_')
 
 
-        # صفحه‌بندی پیام‌های شخصی
-    private_paginator = Paginator(private_messages, 10)
-    private_page_number = request.GET.get('private_page')
-    private_page_obj = private_paginator.get_page(private_page_number)
+    # صفحه‌بندی cursor پیام‌های شخصی
+    private_paginator = CursorPaginator(private_messages, 10)
+    private_page_obj = private_paginator.get_page_from_request(request, prefix='private_')
 
 
     context = {
-        'user_stats': user_stats,
+        'user_stats': stats['user_stats'],
         'contact_messages': contact_page_obj,
         'private_messages': private_page_obj,
-        'pending_contact_count': pending_contact_messages.count(),
-        'pending_private_count': pending_private_messages.count(),
+        'pending_contact_count': stats['pending_contact_count'],
+        'pending_private_count': stats['pending_private_count'],
+        'recent_broadcasts': Broadcast.objects.all()[:5],
     }
     return render(request, 'accounts/dashboard.html', context)
 
@@ -255,59 +304,45 @@ def respond_private_message_view(request, message_id):
 def my_messages_view(request):
     """نمایش پیام‌های کاربر"""
     try:
+        # همه پیام‌های کاربر (دریافتی و ارسالی) در یک جریان زمانی از دیتابیس
+        user_messages = UserMessage.objects.filter(user=request.user)
+        
         # پیام‌های دریافتی کاربر (از ادمین)
-        received_messages = UserMessage.objects.filter(
-            user=request.user,
-            is_from_admin=True
-        ).order_by('-created_at')
+        received_messages = user_messages.filter(is_from_admin=True)
         
         # پیام‌های ارسالی کاربر (به ادمین)
-        sent_messages = UserMessage.objects.filter(
-            user=request.user,
-            is_from_admin=False
-        ).order_by('-created_at')
+        sent_messages = user_messages.filter(is_from_admin=False)
         
-        # پیام‌های تماس کاربر با پاسخ ادمین
-        contact_messages = ContactMessage.objects.filter(
-            user=request.user
-        ).order_by('-created_at')
+        # پیام‌های تماس کاربر با پاسخ ادمین، همراه با شناسه پیام اصلی (اولیه)
+        contact_messages = ContactMessage.objects.filter(user=request.user)
         
-        # برای هر پیام تماس، پیام اصلی (اولیه) را پیدا کن
-        original_messages_dict = {}
-        for contact_msg in contact_messages:
-            # پیدا کردن اولین UserMessage مرتبط با این ContactMessage
-            first_user_message = UserMessage.objects.filter(
-                contact_message=contact_msg,
-                is_from_admin=False
-            ).first()
-            if first_user_message:
-                original_messages_dict[contact_msg.id] = first_user_message
-        
-        # ترکیب تمام پیام‌ها برای نمایش یکپارچه
-        all_messages = list(received_messages) + list(sent_messages)
-        all_messages.sort(key=lambda x: x.created_at, reverse=True)
-        
-        # شمارش پیام‌های خوانده نشده
-        unread_count = received_messages.filter(is_read=False).count()
+        # شمارش پیام‌ها با یک کوئری
+        totals = user_messages.aggregate(
+            total_all=Count('id'),
+            total_received=Count('id', filter=Q(is_from_admin=True)),
+            total_sent=Count('id', filter=Q(is_from_admin=False)),
+            unread_count=Count('id', filter=Q(is_from_admin=True, is_read=False)),
+        )
         
-        # صفحه‌بندی تمام پیام‌ها
-        all_paginator = Paginator(all_messages, 15)
-        all_page_number = request.GET.get('page')
-        all_page_obj = all_paginator.get_page(all_page_number)
+        totals['total_contact'] = contact_messages.count()
         
+        # صفحه‌بندی keyset روی (created_at, id)؛ هر تب cursor جدای خود را دارد
+        # (after، received_after، sent_after و contact_after)
         context = {
-            'all_messages': all_page_obj,
-            'received_messages': received_messages,
-            'sent_messages': sent_messages,
-            'contact_messages': contact_messages,
-            'original_messages_dict': original_messages_dict,  # اضافه کردن این خط
-            'unread_count': unread_count,
-            'total_received': received_messages.count(),
-            'total_sent': sent_messages.count(),
-            'total_all': len(all_messages),
+            'all_messages': CursorPaginator(user_messages, MESSAGES_PER_PAGE).get_page_from_request(request),
+            'received_messages': CursorPaginator(
+                received_messages, MESSAGES_PER_PAGE
+            ).get_page_from_request(request, prefix='received_'),
+            'sent_messages': CursorPaginator(
+                sent_messages, MESSAGES_PER_PAGE
+            ).get_page_from_request(request, prefix='sent_'),
+            'contact_messages': CursorPaginator(
+                contact_messages.with_original_message(), MESSAGES_PER_PAGE
+            ).get_page_from_request(request, prefix='contact_'),
+            **totals,
         }
         
-        logger.info(f"نمایش پیام‌های کاربر {request.user.username} - تعداد: {len(all_messages)}")
+        logger.info(f"نمایش پیام‌های کاربر {request.user.username} - تعداد: {totals['total_all']}")
         return render(request, 'accounts/my_messages.html', context)
         
     except Exception as e:
@@ -318,20 +353,85 @@ def my_messages_view(request):
             'received_messages': [],
             'sent_messages': [],
             'contact_messages': [],
-            'original_messages_dict': {},
             'unread_count': 0,
             'total_received': 0,
             'total_sent': 0,
             'total_all': 0,
+            'total_contact': 0,
         })
     
+def _initial_unread_count(user_id):
+    try:
+        return get_unread_count(user_id)
+    finally:
+        # اتصال دیتابیس این thread در طول باز بودن stream نگه داشته نمی‌شود
+        connection.close()
+
+@login_required
+async def notifications_stream_view(request):
+    """
+    ارسال لحظه‌ای تعداد پیام‌های خوانده نشده و خلاصه پیام‌های جدید با SSE.
+
+    باید زیر ASGI اجرا شود (ACCOUNTS_NOTIFICATION_STREAM)؛ اتصال باز در حالت
+    بیکار هیچ اتصال دیتابیسی نگه نمی‌دارد و فقط منتظر رویدادهای broker است.
+    زیر WSGI پاسخ stream هرگز تمام نمی‌شود، پس در آن حالت notifications_poll_view
+    استفاده می‌شود.
+    """
+    if not getattr(settings, 'ACCOUNTS_NOTIFICATION_STREAM', False):
+        raise Http404
+    user = await request.auser()
+    # اتصالی که احراز هویت در thread درخواست باز کرده همین‌جا بسته می‌شود
+    await sync_to_async(connection.close)()
+    unread_count = await sync_to_async(_initial_unread_count, thread_sensitive=False)(user.pk)
+    
+    broker = get_broker()
+    
+    async def event_stream():
+        subscriber = broker.subscribe(user.pk)
+        queue = subscriber[1]
+        try:
+            yield 'retry: 5000\n\n'
+            yield f"event: unread\ndata: {json.dumps({'count': unread_count})}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=NOTIFICATION_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                data = json.dumps(event['data'], ensure_ascii=False)
+                yield f"event: {event['event']}\ndata: {data}\n\n"
+        finally:
+            broker.unsubscribe(user.pk, subscriber)
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def notifications_poll_view(request):
+    """
+    تعداد پیام‌های خوانده نشده برای اجرا زیر WSGI؛ پاسخ بلافاصله برمی‌گردد و
+    صفحه هر ACCOUNTS_NOTIFICATION_POLL_INTERVAL ثانیه دوباره می‌پرسد تا هیچ
+    worker منتظر تغییر شمارنده نماند. count ارسالی صفحه فقط برای تشخیص تغییر
+    است.
+    """
+    try:
+        known_count = int(request.GET.get('count', ''))
+    except ValueError:
+        known_count = None
+    count = get_unread_count(request.user.pk)
+    response = JsonResponse({'count': count, 'changed': count != known_count})
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 @login_required
 def view_my_message_detail(request, message_id):
     """نمایش جزئیات یک پیام"""
     try:
         # پیدا کردن پیام (هم پیام‌های دریافتی و هم ارسالی)
         message = get_object_or_404(
-            UserMessage.objects.filter(
+            UserMessage.objects.select_related('contact_message', 'conversation').with_original_message().filter(
                 Q(id=message_id) & Q(user=request.user)
             )
         )
@@ -341,34 +441,22 @@ def view_my_message_detail(request, message_id):
             message.mark_as_read()
             logger.info(f"پیام {message_id} توسط کاربر {request.user.username} خوانده شد")
         
-        # پیدا کردن مکالمه مرتبط
-        conversation_messages = []
+        # صفحه‌ای از گفتگوی مرتبط که همین پیام در آن است؛ بقیه با cursor بارگذاری می‌شوند
+        conversation_page, conversation_messages = get_conversation_page(request, message.conversation, message)
         
-        if message.contact_message:
-            # اگر پیام مربوط به تماس است، تمام پیام‌های این تماس را بیاور
-            conversation_messages = UserMessage.objects.filter(
-                contact_message=message.contact_message
-            ).order_by('created_at')
-            
-            # پیدا کردن پیام اصلی (اولیه) برای این تماس
-            original_message = UserMessage.objects.filter(
-                contact_message=message.contact_message,
-                is_from_admin=False
-            ).first()
-        elif message.message_type == 'private':
-            # اگر پیام خصوصی است، تمام پیام‌های خصوصی بین این کاربر و ادمین را بیاور
-            conversation_messages = UserMessage.objects.filter(
-                user=request.user,
-                message_type='private'
-            ).order_by('created_at')
-            original_message = None
-        else:
-            original_message = None
+        original_message = None
+        if message.contact_message and message.original_message_id:
+            # پیام اصلی (اولیه) تماس اگر در همین صفحه از گفتگو باشد دوباره خوانده نمی‌شود
+            original_message = next(
+                (msg for msg in conversation_messages if msg.id == message.original_message_id),
+                None
+            ) or UserMessage.objects.filter(id=message.original_message_id).first()
         
         context = {
             'message': message,
             'conversation_messages': conversation_messages,
-            'original_message': original_message,  # اضافه کردن این خط
+            'conversation_page': conversation_page,
+            'original_message': original_message,
         }
         return render(request, 'accounts/message_detail.html', context)
         
@@ -384,6 +472,10 @@ def send_message_to_user_view(request, user_id=None, message_id=None):
     if user_id:
         user = get_object_or_404(CustomUser, id=user_id)
     
+    original_message = None
+    if user and message_id:
+        original_message = UserMessage.objects.filter(id=message_id, user=user).first()
+    
     if request.method == 'POST':
         form = AdminToUserMessageForm(request.POST)
         if form.is_valid():
@@ -404,24 +496,109 @@ def send_message_to_user_view(request, user_id=None, message_id=None):
     else:
         initial = {}
         if user:
-            initial['user'] = user
-        if request.original_message:
-            initial['subject'] = f"پاسخ به: {request.original_message.subject}"
-            initial['content'] = f"\n\n---------- پیام قبلی ----------\n{request.original_message.content}"
+            initial['user'] = user.id
+        if original_message:
+            initial['subject'] = f"پاسخ به: {original_message.subject}"
+            initial['content'] = f"\n\n---------- پیام قبلی ----------\n{original_message.content}"
         
         form = AdminToUserMessageForm(initial=initial)
     
-    users = CustomUser.objects.filter(is_staff=False).order_by('-date_joined')
-    pending_messages = ContactMessage.objects.filter(status='pending')
+    pending_messages = ContactMessage.objects.filter(status='pending').select_related('user').order_by('-created_at')[:20]
     
     context = {
         'form': form,
-        'users': users,
+        'pending_messages': pending_messages,
         'selected_user': user,
-        'original_message': request.original_message,
+        'original_message': original_message,
     }
     return render(request, 'accounts/send_message_to_user.html', context)
 
+def _autocomplete_users(query):
+    users = filter_users(CustomUser.objects.filter(is_staff=False), query)
+    users = users.order_by('-date_joined', '-id').values(
+        'id', 'first_name', 'last_name', 'username', 'email', 'national_code'
+    )[:AUTOCOMPLETE_LIMIT]
+    return [
+        {
+            'id': user['id'],
+            'name': f"{user['first_name']} {user['last_name']}".strip() or user['username'],
+            'email': user['email'],
+            'national_code': user['national_code'],
+        }
+        for user in users
+    ]
+
+@login_required
+@user_passes_test(is_admin)
+async def user_autocomplete_view(request):
+    """جستجوی ایندکس‌شده و محدود کاربران برای انتخاب گیرنده پیام (typeahead)"""
+    query = request.GET.get('q', '').strip()
+    if len(query) < AUTOCOMPLETE_MIN_LENGTH:
+        return JsonResponse({'results': []})
+    results = await sync_to_async(_autocomplete_users)(query)
+    return JsonResponse({'results': results})
+
+@login_required
+@user_passes_test(is_admin)
+def broadcast_view(request):
+    """ارسال پیام همگانی به کاربران یک نوع یا گروه سنی"""
+    if request.method == 'POST':
+        form = BroadcastForm(request.POST)
+        if form.is_valid():
+            broadcast = form.save(commit=False)
+            broadcast.created_by = request.user
+            broadcast.save()
+            start_broadcast(broadcast)
+            
+            logger.info(f"پیام همگانی {broadcast.id} توسط ادمین {request.user.username} در صف ارسال قرار گرفت")
+            messages.success(request, 'پیام همگانی در صف ارسال قرار گرفت. پیشرفت آن در داشبورد نمایش داده می‌شود.')
+            return redirect('dashboard')
+    else:
+        form = BroadcastForm()
+    
+    return render(request, 'accounts/broadcast.html', {'form': form})
+
+@login_required
+@user_passes_test(is_admin)
+def message_search_view(request):
+    """جستجوی متنی در پیام‌های تماس و پیام‌های کاربران"""
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind', '')
+    if kind not in MESSAGE_KINDS:
+        kind = ''
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    
+    results = []
+    has_next = False
+    if query:
+        try:
+            # یک ردیف اضافه برای تشخیص وجود صفحه بعد، بدون COUNT
+            results = search_entries(
+                query,
+                kind=kind or MESSAGE_KINDS,
+                offset=(page - 1) * SEARCH_RESULTS_PER_PAGE,
+                limit=SEARCH_RESULTS_PER_PAGE + 1
+            )
+        except Exception as e:
+            logger.error(f"خطا در جستجوی پیام‌ها: {str(e)}")
+            messages.error(request, 'عبارت جستجو معتبر نیست.')
+        has_next = len(results) > SEARCH_RESULTS_PER_PAGE
+        results = results[:SEARCH_RESULTS_PER_PAGE]
+    
+    context = {
+        'query': query,
+        'kind': kind,
+        'kinds': [choice for choice in SearchEntry.KIND_CHOICES if choice[0] in MESSAGE_KINDS],
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+        'has_previous': page > 1,
+    }
+    return render(request, 'accounts/message_search.html', context)
+
 @login_required
 @user_passes_test(is_admin)
 def admin_view_message_detail(request, message_id, message_type='contact'):
@@ -429,37 +606,46 @@ def admin_view_message_detail(request, message_id, message_type='contact'):
     try:
         if message_type == 'contact':
             # نمایش پیام تماس
-            message = get_object_or_404(ContactMessage, id=message_id)
+            message = get_object_or_404(
+                ContactMessage.objects.with_original_message(),
+                id=message_id
+            )
             
-            # پیدا کردن UserMessage مرتبط
-            user_messages = UserMessage.objects.filter(
-                contact_message=message
-            ).order_by('created_at')
+            # جدیدترین پیام‌های گفتگوی این تماس
+            conversation = Conversation.objects.filter(contact_message=message).first()
+            conversation_page, user_messages = get_conversation_page(request, conversation)
+            original_message = None
+            if message.original_message_id:
+                original_message = next(
+                    (msg for msg in user_messages if msg.id == message.original_message_id),
+                    None
+                ) or UserMessage.objects.filter(id=message.original_message_id).first()
             
             context = {
                 'message': message,
                 'user_messages': user_messages,
+                'conversation_page': conversation_page,
+                'original_message': original_message,
                 'message_type': 'contact',
             }
             return render(request, 'accounts/admin_message_detail.html', context)
             
         elif message_type == 'private':
             # نمایش پیام خصوصی
-            message = get_object_or_404(UserMessage, id=message_id)
+            message = get_object_or_404(UserMessage.objects.select_related('conversation'), id=message_id)
             
             # علامت‌گذاری به عنوان خوانده شده
             if not message.is_read:
                 message.mark_as_read()
                 logger.info(f"پیام خصوصی {message_id} توسط ادمین خوانده شد")
             
-            # پیدا کردن مکالمه
-            conversation_messages = UserMessage.objects.filter(
-                Q(user=message.user) & Q(message_type='private')
-            ).order_by('created_at')
+            # صفحه‌ای از گفتگو که همین پیام در آن است
+            conversation_page, conversation_messages = get_conversation_page(request, message.conversation, message)
             
             context = {
                 'message': message,
                 'conversation_messages': conversation_messages,
+                'conversation_page': conversation_page,
                 'message_type': 'private',
             }
             return render(request, 'accounts/admin_message_detail.html', context)
@@ -512,28 +698,28 @@ def test_create_message_view(request):
                 )
             
             elif message_type == 'response':
-                admin_user = CustomUser.objects.filter(is_staff=True).first()
-                if admin_user:
+                sender_id = get_system_sender_id()
+                if sender_id:
                     UserMessage.objects.create(
                         user=request.user,
                         is_from_admin=True,
                         message_type='response',
                         subject=subject,
                         content=content,
-                        sender=admin_user,
+                        sender_id=sender_id,
                         is_read=False
                     )
             
             else:
-                admin_user = CustomUser.objects.filter(is_staff=True).first()
-                if admin_user:
+                sender_id = get_system_sender_id()
+                if sender_id:
                     UserMessage.objects.create(
                         user=request.user,
                         is_from_admin=True,
                         message_type='private',
                         subject=subject,
                         content=content,
-                        sender=admin_user,
+                        sender_id=sender_id,
                         is_read=False
                     )
             
@@ -547,46 +733,52 @@ def test_create_message_view(request):
 
 
 
-@login_required
-@user_passes_test(is_admin)
-def user_management_view(request):
-    """مدیریت کاربران توسط ادمین"""
-    # جستجو
+def get_filtered_users(request):
+    """
+    کاربران فیلتر شده با جستجو و نوع کاربر (مشترک بین لیست کاربران و خروجی)؛
+    جستجوی نام به صورت زیرکوئری است و سقفی ندارد، پس خروجی همه نتایج را شامل می‌شود.
+    """
     search_query = request.GET.get('search', '')
     user_type_filter = request.GET.get('user_type', '')
     
-    # فیلتر کردن کاربران
-    users = CustomUser.objects.all().order_by('-date_joined')
+    users = CustomUser.objects.all()
     
     if search_query:
-        users = users.filter(
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(national_code__icontains=search_query) |
-            Q(phone_number__icontains=search_query)
-        )
+        users = filter_users(users, search_query)
     
     if user_type_filter:
         users = users.filter(user_type=user_type_filter)
     
+    return users, search_query, user_type_filter
+
+class Echo:
+    """شیء شبه فایل که مقدار نوشته شده را برمی‌گرداند تا csv.writer سطر به سطر stream شود"""
+    def write(self, value):
+        return value
+
+def csv_safe(value):
+    """خنثی کردن مقدار متنی کاربر که در صفحه‌گسترده به عنوان فرمول اجرا می‌شود"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+@login_required
+@user_passes_test(is_admin)
+def user_management_view(request):
+    """مدیریت کاربران توسط ادمین"""
+    users, search_query, user_type_filter = get_filtered_users(request)
+    
     # آمار کاربران
-    user_stats = {
-        'total': CustomUser.objects.count(),
-        'normal': CustomUser.objects.filter(user_type='normal').count(),
-        'worker': CustomUser.objects.filter(user_type='worker').count(),
-        'employee': CustomUser.objects.filter(user_type='employee').count(),
-        'staff': CustomUser.objects.filter(is_staff=True).count(),
-    }
+    user_stats = get_dashboard_stats()['user_stats']
     
-    # صفحه‌بندی
-    paginator = Paginator(users, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # صفحه‌بندی cursor؛ تعداد کل فقط بدون فیلتر و از snapshot آمار نمایش داده می‌شود
+    paginator = CursorPaginator(users, 20, ordering=('-date_joined', '-id'))
+    page_obj = paginator.get_page_from_request(request)
     
     context = {
         'users': page_obj,
+        'bulk_form': BulkUserActionForm(),
+        'users_count': None if search_query or user_type_filter else user_stats['total'],
         'user_stats': user_stats,
         'search_query': search_query,
         'user_type_filter': user_type_filter,
@@ -594,6 +786,58 @@ def user_management_view(request):
     }
     return render(request, 'accounts/user_management.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def bulk_user_action_view(request):
+    """فعال/غیرفعال کردن یا تغییر نوع گروهی از کاربران با یک UPDATE"""
+    if request.method != 'POST':
+        return redirect('user_management')
+    
+    form = BulkUserActionForm(request.POST)
+    if form.is_valid():
+        updated = bulk_update_users(form.cleaned_data['user_ids'], request.user, **form.get_fields())
+        action_name = dict(BulkUserActionForm.ACTION_CHOICES)[form.cleaned_data['action']]
+        messages.success(request, f'عملیات «{action_name}» روی {updated} کاربر انجام شد.')
+    else:
+        for errors in form.errors.values():
+            messages.error(request, errors[0])
+    
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('user_management')
+
+@login_required
+@user_passes_test(is_admin)
+def export_users_view(request):
+    """خروجی CSV از لیست فیلتر شده کاربران، به صورت stream و بدون بارگذاری کل لیست در حافظه"""
+    users, search_query, user_type_filter = get_filtered_users(request)
+    rows = users.order_by('-date_joined', '-id').values_list(
+        *[name for name, _ in USER_EXPORT_COLUMNS]
+    ).iterator(chunk_size=USER_EXPORT_CHUNK_SIZE)
+    
+    user_types = dict(CustomUser.USER_TYPE_CHOICES)
+    age_groups = dict(CustomUser.AGE_GROUP_CHOICES)
+    
+    def stream():
+        writer = csv.writer(Echo())
+        # BOM برای نمایش درست متن فارسی در Excel
+        yield '\ufeff'
+        yield writer.writerow([label for _, label in USER_EXPORT_COLUMNS])
+        for (user_id, username, first_name, last_name, national_code, phone_number,
+             email, user_type, age_group, birth_date, is_active, date_joined) in rows:
+            yield writer.writerow([csv_safe(value) for value in (
+                user_id, username, first_name, last_name, national_code, phone_number or '',
+                email, user_types.get(user_type, user_type), age_groups.get(age_group, ''),
+                to_jalali(birth_date), 'بله' if is_active else 'خیر',
+                to_jalali(timezone.localtime(date_joined)),
+            )])
+    
+    logger.info(f"خروجی لیست کاربران توسط ادمین {request.user.username} (جستجو: {search_query}، نوع: {user_type_filter})")
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="users-{timezone.localtime():%Y%m%d-%H%M}.csv"'
+    return response
+
 @login_required
 @user_passes_test(is_admin)
 def view_user_detail(request, user_id):
@@ -633,6 +877,29 @@ def update_user_type(request, user_id):
     }
     return render(request, 'accounts/update_user_type.html', context)
 
+@login_required
+def profile_image_view(request, user_id, size=None, image_format=None):
+    """
+    عکس پروفایل کاربر (یا تصویر کوچک آن) با ETag/Last-Modified تا صفحات لیست
+    آن را از cache مرورگر بخوانند
+    """
+    user = get_object_or_404(CustomUser.objects.only('profile_image'), id=user_id)
+    if not user.profile_image or not os.path.exists(user.profile_image.path):
+        return redirect('/static/images/default_profile.jpg')
+    if size is not None:
+        if size not in PROFILE_THUMBNAIL_SIZES or image_format not in THUMBNAIL_FORMATS:
+            raise Http404
+        thumbnail = get_thumbnail(user.profile_image, size, image_format)
+        if thumbnail is not None:
+            return file_response(request, thumbnail)
+        # عکس‌هایی که قبل از ساخت تصاویر کوچک آپلود شده‌اند
+    return file_response(request, user.profile_image)
+
+def job_document_filename(user):
+    # فایل‌ها با hash محتوا ذخیره می‌شوند؛ نام دانلود از روی کاربر ساخته می‌شود
+    extension = os.path.splitext(user.job_document.name)[1]
+    return f'job_document_{user.username}{extension}'
+
 @login_required
 @user_passes_test(is_admin)
 def view_job_document(request, user_id):
@@ -647,12 +914,7 @@ def view_job_document(request, user_id):
         # بررسی وجود فایل
         if os.path.exists(user.job_document.path):
             # نمایش فایل در مرورگر
-            response = FileResponse(
-                open(user.job_document.path, 'rb'),
-                content_type='application/pdf'
-            )
-            response['Content-Disposition'] = f'inline; filename="{os.path.basename(user.job_document.name)}"'
-            return response
+            return file_response(request, user.job_document, filename=job_document_filename(user))
         else:
             messages.error(request, 'فایل مستند شغلی پیدا نشد.')
             return redirect('user_detail', user_id=user_id)
@@ -673,12 +935,7 @@ def download_job_document(request, user_id):
     
     try:
         if os.path.exists(user.job_document.path):
-            response = HttpResponse(
-                open(user.job_document.path, 'rb').read(),
-                content_type='application/octet-stream'
-            )
-            response['Content-Disposition'] = f'attachment; filename="{os.path.basename(user.job_document.name)}"'
-            return response
+            return file_response(request, user.job_document, as_attachment=True, filename=job_document_filename(user))
         else:
             messages.error(request, 'فایل مستند شغلی پیدا نشد.')
             return redirect('user_detail', user_id=user_id)
@@ -3,6 +3,10 @@ ASGI config for sell_pool_ticket project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The real-time message notifications (``accounts/messages/stream/``) are
+long-lived Server-Sent Events streams and need to be served through this
+entry point, e.g. ``uvicorn sell_pool_ticket.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -63,6 +63,17 @@ DATABASES = {
     }
 }
 
+# شمارنده‌های پیام از cache خوانده می‌شوند؛ در production از یک cache مشترک
+# (مثل Redis یا Memcached) بین پروسه‌ها استفاده کنید. LocMemCache برای هر
+# پروسه جداست و شمارنده پروسه‌های دیگر تا UNREAD_COUNT_CACHE_TTL (۶۰ ثانیه)
+# قدیمی می‌ماند
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sell-pool-ticket',
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -90,10 +101,46 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# hash محتوای فایل‌ها در زمان آپلود محاسبه می‌شود (accounts.storage.ContentAddressedStorage)
+FILE_UPLOAD_HANDLERS = [
+    'accounts.uploadhandlers.HashingMemoryFileUploadHandler',
+    'accounts.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+
+# ارسال فایل‌های محافظت شده (مستند شغلی) توسط وب سرور جلویی:
+# None (ارسال توسط Django)، 'x-accel-redirect' (nginx) یا 'x-sendfile'
+ACCOUNTS_FILE_OFFLOAD = None
+# location داخلی nginx که به MEDIA_ROOT اشاره می‌کند (برای x-accel-redirect)
+ACCOUNTS_X_ACCEL_PREFIX = '/protected-media/'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# اعلان لحظه‌ای با Server-Sent Events فقط وقتی پروژه زیر ASGI اجرا می‌شود
+# (uvicorn sell_pool_ticket.asgi:application)؛ زیر WSGI/runserver صفحات هر
+# ACCOUNTS_NOTIFICATION_POLL_INTERVAL ثانیه messages/poll/ را می‌خوانند
+ACCOUNTS_NOTIFICATION_STREAM = False
+ACCOUNTS_NOTIFICATION_POLL_INTERVAL = 30
+
+# کاربر جلسه و خود جلسه از cache خوانده می‌شوند تا درخواست‌های تکراری
+# برای احراز هویت به پایگاه داده نروند
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# PBKDF2 با تعداد تکرار قابل تنظیم؛ با تغییر ACCOUNTS_PASSWORD_ITERATIONS رمز عبور
+# کاربران در اولین ورود دوباره hash می‌شود. ACCOUNTS_HASHING_WORKERS تعداد threadهای
+# hash در ورود و ثبت نام async است (پیش‌فرض: تعداد هسته‌ها)
+PASSWORD_HASHERS = [
+    'accounts.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+ACCOUNTS_PASSWORD_ITERATIONS = None
+ACCOUNTS_HASHING_WORKERS = None
+
 LOGIN_URL = '/accounts/login/'
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"